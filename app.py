@@ -1,23 +1,155 @@
-from flask import Flask, request, jsonify, send_file, after_this_request
+from flask import Flask, Request, request, g, jsonify, send_file
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException
 import os
-import PyPDF2
-from PIL import Image
-from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, A4
+import importlib
 import tempfile
 import zipfile
 from datetime import datetime
 import io
+import math
+import time
+import atexit
+import threading
+import multiprocessing
+import hashlib
+import json
+import mimetypes
+import re
+import shutil
+import signal
+import sys
+import uuid
+import cProfile
+import pstats
+import glob
+import itertools
+import queue
+from contextlib import contextmanager
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait as wait_futures
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as TaskTimeoutError
 try:
-    import fitz  # PyMuPDF
-    PYMUPDF_AVAILABLE = True
-except ImportError:
-    PYMUPDF_AVAILABLE = False
-    print("PyMuPDF not available, using basic compression")
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+class LazyModule:
+    """A module that is imported the first time one of its attributes is used.
+
+    Keeps the PDF, image and Office libraries out of startup, so the routes
+    are ready to serve before any tool has run. ``on_load`` is called with
+    the module right after it is imported. The import time is recorded as
+    the pdf_master_backend_import_seconds metric.
+    """
+
+    def __init__(self, name, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if self._on_load is not None:
+                        self._on_load(module)
+                    set_metric('pdf_master_backend_import_seconds',
+                               time.perf_counter() - start, module=self._name)
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+def configure_reportlab(canvas_module):
+    from reportlab import rl_config
+    # Store image data as binary instead of ASCII85, which inflates it by a quarter
+    rl_config.useA85 = 0
+
+PyPDF2 = LazyModule('PyPDF2')
+Image = LazyModule('PIL.Image')
+canvas = LazyModule('reportlab.pdfgen.canvas', on_load=configure_reportlab)
+rl_utils = LazyModule('reportlab.lib.utils')
+fitz = LazyModule('fitz')  # PyMuPDF, optional
+pptx = LazyModule('pptx')
+docx = LazyModule('docx')
+
+BACKENDS = [PyPDF2, Image, canvas, rl_utils, fitz, pptx, docx]
+
+def pymupdf_available():
+    try:
+        fitz._load()
+    except ImportError:
+        return False
+    return True
+
+def warm_up():
+    """Import every backend now rather than on the first request that needs it."""
+    for backend in BACKENDS:
+        try:
+            backend._load()
+        except ImportError:
+            if backend is fitz:
+                print("PyMuPDF not available, using basic compression")
+            else:
+                raise
 
 app = Flask(__name__, static_folder='.', static_url_path='')
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 500)) * 1024 * 1024
+# Uploads are written here as they arrive
+app.config['UPLOAD_DIR'] = os.environ.get('UPLOAD_DIR', tempfile.gettempdir())
+app.config['MERGE_FLUSH_BYTES'] = int(os.environ.get('MERGE_FLUSH_MB', 64)) * 1024 * 1024
+# PDF work runs in a process pool; PDF_WORKERS=0 runs it on the request thread
+app.config['PDF_WORKERS'] = int(os.environ.get('PDF_WORKERS', os.cpu_count() or 1))
+app.config['PDF_TASK_TIMEOUT'] = int(os.environ.get('PDF_TASK_TIMEOUT', 300))
+app.config['PDF_WORKER_MAX_TASKS'] = int(os.environ.get('PDF_WORKER_MAX_TASKS', 20))
+# Threads decoding and scaling images for /jpg-to-pdf
+app.config['IMAGE_DECODE_THREADS'] = int(os.environ.get('IMAGE_DECODE_THREADS', min(4, os.cpu_count() or 1)))
+# Largest page range handed to one worker when extracting text for PowerPoint or Word
+app.config['EXTRACT_CHUNK_PAGES'] = int(os.environ.get('EXTRACT_CHUNK_PAGES',
+                                                       os.environ.get('PPT_CHUNK_PAGES', 50)))
+# Pages whose extracted text is kept, so converting one PDF to several formats
+# extracts each page once; EXTRACT_CACHE_PAGES=0 disables the cache. The cache
+# is per process, so it only hits when both requests reach the same worker
+app.config['EXTRACT_CACHE_PAGES'] = int(os.environ.get('EXTRACT_CACHE_PAGES', 5000))
+# Largest page range one worker renders for /pdf-to-jpg before its images are sent
+app.config['RASTER_CHUNK_PAGES'] = int(os.environ.get('RASTER_CHUNK_PAGES', 8))
+# Asynchronous jobs: uploads and results live under JOBS_DIR until JOB_RESULT_TTL expires
+app.config['JOBS_DIR'] = os.environ.get('JOBS_DIR', os.path.join(tempfile.gettempdir(), 'pdf_master_jobs'))
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_RESULT_TTL'] = int(os.environ.get('JOB_RESULT_TTL', 3600))
+# An unfinished job whose process has not touched it for this long is marked
+# failed (its worker died); processes touch their jobs every JOB_HEARTBEAT
+app.config['JOB_STALE_AFTER'] = int(os.environ.get('JOB_STALE_AFTER', 300))
+app.config['JOB_HEARTBEAT'] = int(os.environ.get('JOB_HEARTBEAT', 30))
+# Admission control, for the whole server (all gunicorn workers together): tool
+# runs start while their estimated memory fits in ADMISSION_BUDGET_MB and fewer
+# than ADMISSION_MAX_RUNNING are running. Up to ADMISSION_MAX_QUEUE more wait up to ADMISSION_WAIT seconds for
+# a turn; the rest get a 503 asking them to come back after ADMISSION_RETRY_AFTER
+app.config['ADMISSION_BUDGET_BYTES'] = int(os.environ.get('ADMISSION_BUDGET_MB', 1024)) * 1024 * 1024
+app.config['ADMISSION_MAX_RUNNING'] = int(os.environ.get('ADMISSION_MAX_RUNNING', max(2, 2 * (os.cpu_count() or 1))))
+app.config['ADMISSION_MAX_QUEUE'] = int(os.environ.get('ADMISSION_MAX_QUEUE', 16))
+app.config['ADMISSION_WAIT'] = float(os.environ.get('ADMISSION_WAIT', 30))
+app.config['ADMISSION_RETRY_AFTER'] = int(os.environ.get('ADMISSION_RETRY_AFTER', 10))
+# Who encrypts and decrypts for protect and unlock: "auto" uses PyMuPDF when
+# it is installed, "pypdf2" always uses PyPDF2 (which only writes RC4)
+app.config['PDF_CRYPTO'] = os.environ.get('PDF_CRYPTO', 'auto')
+# Documents of one bulk request processed at the same time
+app.config['BULK_WORKERS'] = int(os.environ.get('BULK_WORKERS', 4))
+# Let a fronting proxy such as nginx send result files itself
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '0') == '1'
+# Tool results keyed by input hash and options; RESULT_CACHE_MB=0 disables the cache
+app.config['RESULT_CACHE_DIR'] = os.environ.get('RESULT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pdf_master_cache'))
+app.config['RESULT_CACHE_BYTES'] = int(os.environ.get('RESULT_CACHE_MB', 1024)) * 1024 * 1024
+# Requests sent with "X-Profile: 1" are profiled into PROFILE_DIR; unset disables profiling
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR')
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 ALLOWED_EXTENSIONS = {
     'pdf': ['pdf'],
@@ -27,16 +159,1751 @@ ALLOWED_EXTENSIONS = {
 def allowed_file(filename, file_type):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS[file_type]
 
-def send_file_and_cleanup(file_path, filename):
-    @after_this_request
-    def remove_file(response):
+def send_result(path, filename):
+    """Send a finished result as a download.
+
+    Responses are conditional, so clients can resume with a Range request,
+    and the file is handed to the server's wsgi.file_wrapper (sendfile
+    under gunicorn) or to the proxy when USE_X_SENDFILE is set.
+    """
+    return send_file(path, as_attachment=True, download_name=filename,
+                     conditional=True, etag=True, max_age=0)
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+# Workers report (task id, pid, start time) here as they pick up each task
+_task_starts_queue = None
+_task_starts = {}
+_task_starts_lock = threading.Lock()
+_task_ids = itertools.count()
+# Pools taken out of use after a timeout: pool -> {future: pid} of its stuck tasks
+_retired_pools = {}
+# Futures not yet done, by the pool they were submitted to
+_pool_futures = {}
+
+# How often a waiting request checks whether its task has started
+TASK_START_POLL = 0.1
+
+def get_pdf_pool():
+    global _pdf_pool, _task_starts_queue
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            context = multiprocessing.get_context('spawn')
+            if _task_starts_queue is None:
+                _task_starts_queue = context.Queue()
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=app.config['PDF_WORKERS'],
+                mp_context=context,
+                max_tasks_per_child=app.config['PDF_WORKER_MAX_TASKS'],
+                initializer=init_pdf_worker,
+                initargs=(_task_starts_queue,),
+            )
+        return _pdf_pool
+
+def init_pdf_worker(task_starts_queue):
+    global _task_starts_queue
+    _task_starts_queue = task_starts_queue
+
+def shutdown_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        pool, _pdf_pool = _pdf_pool, None
+    if pool is not None:
+        pool.shutdown()
+        with _pdf_pool_lock:
+            _pool_futures.pop(pool, None)
+
+atexit.register(shutdown_pdf_pool)
+
+def submit_pdf_task(pool, *args):
+    """Submit ``call_in_worker(*args)`` to ``pool``, keeping track of the
+    future until it is done (see drain_retired_pool)."""
+    future = pool.submit(call_in_worker, *args)
+    with _pdf_pool_lock:
+        outstanding = _pool_futures.setdefault(pool, set())
+        outstanding.add(future)
+    
+    def forget(done):
+        with _pdf_pool_lock:
+            outstanding.discard(done)
+    
+    future.add_done_callback(forget)
+    return future
+
+def retire_pdf_pool(pool, future, pid):
+    """Take ``pool`` out of use because ``future`` overran on worker ``pid``.
+
+    The executor cannot cancel a running task, and killing one worker breaks
+    the whole executor, failing every other request's tasks on it. So new
+    tasks go to a fresh pool, and the stuck worker is killed only once the
+    tasks already running or queued on the old one have finished.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is pool:
+            _pdf_pool = None
+        stuck = _retired_pools.setdefault(pool, {})
+        stuck[future] = pid
+        if len(stuck) > 1:
+            return
+    threading.Thread(target=drain_retired_pool, args=(pool,), name='pdf-pool-drain',
+                     daemon=True).start()
+
+def drain_retired_pool(pool):
+    # Checked again after each wait: a batch may have submitted to the pool
+    # just before it was retired, and another task on it may get stuck too
+    while True:
+        with _pdf_pool_lock:
+            others = _pool_futures.get(pool, set()) - set(_retired_pools[pool])
+        if not others:
+            break
+        wait_futures(others, timeout=1)
+    with _pdf_pool_lock:
+        pids = set(_retired_pools.pop(pool).values())
+        _pool_futures.pop(pool, None)
+    for pid in pids:
         try:
-            os.unlink(file_path)
-        except Exception:
+            os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except OSError:
+            pass
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def task_started(task_id):
+    """The (pid, start time) of the worker running ``task_id``, or None
+    while it is still queued."""
+    with _task_starts_lock:
+        while True:
+            try:
+                started_id, pid, started_at = _task_starts_queue.get_nowait()
+            except queue.Empty:
+                break
+            # Reports for tasks no one is waiting on any more are dropped
+            if started_id in _task_starts:
+                _task_starts[started_id] = (pid, started_at)
+        return _task_starts.get(task_id)
+
+def expect_task():
+    """A new task id, whose start task_started will look out for."""
+    task_id = next(_task_ids)
+    with _task_starts_lock:
+        _task_starts[task_id] = None
+    return task_id
+
+def forget_task(task_id):
+    with _task_starts_lock:
+        _task_starts.pop(task_id, None)
+
+def wait_for_task(future, task_id, timeout):
+    """The result of ``future``, allowing it ``timeout`` seconds from when a
+    worker starts it; time spent queued behind other tasks does not count.
+    """
+    while True:
+        started = task_started(task_id)
+        if started is None:
+            wait = TASK_START_POLL
+        else:
+            wait = max(0, started[1] + timeout - time.time())
+        try:
+            return future.result(timeout=wait)
+        except TaskTimeoutError:
+            if started is not None:
+                raise
+
+def pdf_pool_enabled():
+    return app.config['PDF_WORKERS'] > 0 and multiprocessing.parent_process() is None
+
+def run_pdf_task(func, *args):
+    """Run ``func(*args)`` in the PDF worker pool and return its result.
+
+    Workers are recycled after PDF_WORKER_MAX_TASKS tasks to release memory
+    held by PyMuPDF. A task that runs longer than PDF_TASK_TIMEOUT fails,
+    and its pool is retired (see retire_pdf_pool) so the next task starts
+    on a fresh one. Work runs inline when the pool is disabled or when
+    called from inside a worker.
+    """
+    return map_pdf_tasks(func, [args])[0]
+
+def map_pdf_tasks(func, arg_tuples):
+    """Run ``func(*args)`` for every tuple in the worker pool, results in order.
+
+    PDF_TASK_TIMEOUT applies to each task from when a worker starts it.
+    """
+    return list(imap_pdf_tasks(func, arg_tuples))
+
+def imap_pdf_tasks(func, arg_tuples, window=None):
+    """Like map_pdf_tasks, but yield each result as soon as it and the ones
+    before it are done.
+
+    With a ``window``, at most that many tasks are submitted or waiting to
+    be collected at a time, which bounds how many results are held;
+    otherwise every task is submitted up front. Closing the generator early
+    cancels the tasks that have not started.
+    """
+    if not pdf_pool_enabled():
+        for done, args in enumerate(arg_tuples, 1):
+            result = func(*args)
+            report_progress(done / len(arg_tuples))
+            yield result
+        return
+    
+    stats = current_run()
+    window = window or len(arg_tuples)
+    futures = deque()
+    submitted = 0
+    timeout = app.config['PDF_TASK_TIMEOUT']
+    try:
+        for done in range(1, len(arg_tuples) + 1):
+            while submitted < len(arg_tuples) and len(futures) < window:
+                # Looked up per task, so a batch moves off a retired pool
+                pool = get_pdf_pool()
+                task_id = expect_task()
+                future = submit_pdf_task(pool, func, arg_tuples[submitted], task_id, time.time(),
+                                         stats.worker_profile_path() if stats else None)
+                futures.append((pool, task_id, future))
+                submitted += 1
+            pool, task_id, future = futures.popleft()
+            try:
+                result, worker_stats = wait_for_task(future, task_id, timeout)
+            except TaskTimeoutError:
+                retire_pdf_pool(pool, future, task_started(task_id)[0])
+                raise Exception(f'Processing timed out after {timeout} seconds')
+            finally:
+                forget_task(task_id)
+            if stats is not None:
+                stats.merge(worker_stats)
+            report_progress(done / len(arg_tuples))
+            yield result
+    finally:
+        for _, task_id, future in futures:
+            future.cancel()
+            forget_task(task_id)
+
+def call_in_worker(func, args, task_id, submitted_at, profile_path):
+    """Run ``func(*args)`` in a pool worker and report what it cost.
+
+    Tells the parent when the task starts, for PDF_TASK_TIMEOUT. Returns the
+    result with the worker's RunStats, which include the time the task
+    waited for a free worker.
+    """
+    started_at = time.time()
+    _task_starts_queue.put((task_id, os.getpid(), started_at))
+    stats = RunStats()
+    stats.add_stage('pool_wait', started_at - submitted_at)
+    with collect_run_stats(stats):
+        if profile_path:
+            profiler = cProfile.Profile()
+            try:
+                result = profiler.runcall(func, *args)
+            finally:
+                profiler.dump_stats(profile_path)
+        else:
+            result = func(*args)
+    stats.peak_rss = peak_rss()
+    return result, stats
+
+class RunStats:
+    """Where one run of a tool spent its time, and how much it handled.
+
+    Stages are timed with ``stage``; work done in pool workers is merged in
+    by map_pdf_tasks. ``peak_rss`` is the largest resident set of any pool
+    worker the run used, which covers everything the worker has done since
+    it started (workers are recycled every PDF_WORKER_MAX_TASKS tasks).
+    """
+
+    def __init__(self, profile_prefix=None):
+        self.stages = {}
+        self.pages = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.peak_rss = 0
+        self.profile_prefix = profile_prefix
+        self.worker_profiles = 0
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0) + seconds
+
+    def merge(self, other):
+        for name, seconds in other.stages.items():
+            self.add_stage(name, seconds)
+        self.pages += other.pages
+        self.peak_rss = max(self.peak_rss, other.peak_rss)
+
+    def worker_profile_path(self):
+        if self.profile_prefix is None:
+            return None
+        self.worker_profiles += 1
+        return f'{self.profile_prefix}-worker{self.worker_profiles}.prof'
+
+    def server_timing(self):
+        """The stages as a Server-Timing header value."""
+        return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items())
+
+_run = threading.local()
+
+def current_run():
+    return getattr(_run, 'stats', None)
+
+@contextmanager
+def collect_run_stats(stats):
+    """Make ``stats`` the collection that stages on this thread record into."""
+    previous = current_run()
+    _run.stats = stats
+    try:
+        yield stats
+    finally:
+        _run.stats = previous
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage ``name`` of the current tool run."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_run()
+        if stats is not None:
+            stats.add_stage(name, time.perf_counter() - start)
+
+def count_pages(pages):
+    stats = current_run()
+    if stats is not None:
+        stats.pages += pages
+
+def count_bytes(input_bytes, output_bytes):
+    stats = current_run()
+    if stats is not None:
+        stats.input_bytes += input_bytes
+        stats.output_bytes += output_bytes
+
+def peak_rss():
+    """Return the peak resident memory of this process in bytes, or 0."""
+    # Linux keeps ru_maxrss across exec, so a newly spawned worker would
+    # report its parent's peak; VmHWM starts again with the new process
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return 0
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def new_profile_id():
+    """Return an id to profile the current request under, or None."""
+    if not app.config['PROFILE_DIR'] or request.headers.get('X-Profile') != '1':
+        return None
+    os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+    return uuid.uuid4().hex
+
+@contextmanager
+def instrument(tool, profile_id=None):
+    """Collect RunStats for one run of ``tool`` and record them as metrics.
+
+    With a ``profile_id`` the run, including its pool tasks, is profiled
+    into PROFILE_DIR; see /profiles/<profile_id>.
+    """
+    prefix = os.path.join(app.config['PROFILE_DIR'], profile_id) if profile_id else None
+    stats = RunStats(prefix)
+    profiler = cProfile.Profile() if profile_id else None
+    with collect_run_stats(stats):
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Only one profiler can run at a time on newer Pythons
+                profiler = None
+        try:
+            yield stats
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(prefix + '.prof')
+            record_run_stats(tool, stats)
+
+def record_run_stats(tool, stats):
+    for name, seconds in stats.stages.items():
+        observe_metric('pdf_master_stage_seconds', seconds, tool=tool.name, stage=name)
+    if stats.pages:
+        increment_metric('pdf_master_pages_total', stats.pages, tool=tool.name)
+    if stats.input_bytes:
+        increment_metric('pdf_master_input_bytes_total', stats.input_bytes, tool=tool.name)
+    if stats.output_bytes:
+        increment_metric('pdf_master_output_bytes_total', stats.output_bytes, tool=tool.name)
+    if stats.peak_rss:
+        observe_metric('pdf_master_worker_peak_rss_bytes', stats.peak_rss, tool=tool.name)
+
+_progress = threading.local()
+
+def report_progress(fraction):
+    """Tell the job running on this thread, if any, how far along it is."""
+    callback = getattr(_progress, 'callback', None)
+    if callback is not None:
+        callback(fraction)
+
+def read_pdf_pages(input_path):
+    with stage('read'):
+        pages = list(PyPDF2.PdfReader(input_path).pages)
+    count_pages(len(pages))
+    return pages
+
+def write_pdf_pages(pages, output_path, password=None, encryption='aes-256'):
+    if password and crypto_backend() == 'pymupdf':
+        # Encrypting in PyMuPDF is far faster, even with the extra copy
+        plain_path = output_path + '.plain'
+        try:
+            write_pdf_pages(pages, plain_path)
+            encrypt_pdf_file(plain_path, output_path, password, encryption)
+        finally:
+            os.unlink(plain_path)
+        return
+    
+    if password and encryption != 'rc4-128':
+        raise Exception(f'PyMuPDF is required for {encryption} encryption')
+    with stage('write'):
+        writer = PyPDF2.PdfWriter()
+        
+        for page in pages:
+            writer.add_page(page)
+        
+        if password:
+            writer.encrypt(password)
+        
+        with open(output_path, 'wb') as output_file:
+            writer.write(output_file)
+
+# Encryption methods protect-pdf offers, and the PyMuPDF constant for each
+ENCRYPTION_METHODS = {
+    'aes-256': 'PDF_ENCRYPT_AES_256',
+    'aes-128': 'PDF_ENCRYPT_AES_128',
+    'rc4-128': 'PDF_ENCRYPT_RC4_128',
+}
+
+def crypto_backend():
+    """Which library encrypts and decrypts PDFs: 'pymupdf' or 'pypdf2'."""
+    if app.config['PDF_CRYPTO'] == 'pypdf2' or not pymupdf_available():
+        return 'pypdf2'
+    return 'pymupdf'
+
+def resolve_encryption(encryption):
+    """The encryption method to write for the one a request asked for.
+
+    An empty value asks for the strongest method the backend writes: AES-256
+    with PyMuPDF, RC4 with PyPDF2 alone. Naming an AES method that the
+    backend cannot write is a client error.
+    """
+    if not encryption:
+        return 'aes-256' if crypto_backend() == 'pymupdf' else 'rc4-128'
+    if encryption not in ENCRYPTION_METHODS:
+        raise ToolError(f'Invalid value for encryption: {encryption}')
+    if encryption != 'rc4-128' and crypto_backend() != 'pymupdf':
+        raise ToolError(f'{encryption} encryption is not available on this server; use rc4-128')
+    return encryption
+
+def encrypt_pdf_file(input_path, output_path, password, encryption):
+    """Copy ``input_path`` to ``output_path`` encrypted with ``password``.
+
+    MuPDF encrypts each object as it writes it (AES with its own C
+    implementation), and copies everything else as it is. Returns the
+    number of pages.
+    """
+    with stage('read'):
+        doc = fitz.open(input_path)
+    try:
+        with stage('encrypt'):
+            doc.save(output_path, encryption=getattr(fitz, ENCRYPTION_METHODS[encryption]),
+                     user_pw=password, owner_pw=password)
+        return doc.page_count
+    finally:
+        doc.close()
+
+# How a tool that changes a few pages writes its output
+WRITE_MODES = ('incremental', 'rewrite')
+
+def save_stamped_pages(input_path, pages, changed, output_path, write_mode='incremental'):
+    """Write ``pages`` after the pages at indexes ``changed`` were stamped."""
+    if write_mode not in WRITE_MODES:
+        raise ToolError(f'Invalid value for writeMode: {write_mode}')
+    if write_mode == 'incremental' and write_pdf_incremental(input_path, pages, changed, output_path):
+        return
+    write_pdf_pages(pages, output_path)
+
+def write_pdf_incremental(input_path, pages, changed, output_path):
+    """Write the ``changed`` pages as an incremental update of ``input_path``.
+
+    The original bytes are copied as they are and followed by the changed
+    page objects, the objects they newly refer to (overlay content, fonts)
+    and a cross-reference section whose /Prev points at the original one,
+    so the time taken depends on the pages changed rather than the size of
+    the document, and earlier revisions stay intact. Returns False without
+    writing anything when the input cannot be updated this way.
+    """
+    generic = PyPDF2.generic
+    if not changed:
+        shutil.copyfile(input_path, output_path)
+        return True
+    reader = pages[changed[0]].indirect_reference.pdf
+    if reader.is_encrypted:
+        # New objects would have to be encrypted with the original key
+        return False
+
+    with open(input_path, 'rb') as f:
+        f.seek(max(0, os.path.getsize(input_path) - 1024))
+        tail = f.read()
+        match = re.search(rb'startxref\s+(\d+)', tail[tail.rfind(b'startxref'):])
+        if match is None:
+            return False
+        prev = int(match.group(1))
+        f.seek(prev)
+        head = f.read(32)
+    # A wrong offset means PyPDF2 rebuilt the xref; /Prev cannot point at it
+    if head.startswith(b'xref'):
+        xref_stream = False
+    elif re.match(rb'\d+\s+\d+\s+obj\b', head):
+        # Updates to a file indexed by a cross-reference stream must use one too
+        xref_stream = True
+    else:
+        return False
+
+    # PyPDF2 leaves /Size out of the trailer of files with xref streams
+    known = [number for section in reader.xref.values() for number in section]
+    next_number = max([int(reader.trailer.get('/Size', 0))] +
+                      [number + 1 for number in known + list(reader.xref_objStm)])
+    numbers = {}
+    pending = deque()
+
+    def allocate(key, obj):
+        nonlocal next_number
+        if key not in numbers:
+            numbers[key] = next_number
+            pending.append((next_number, 0, obj))
+            next_number += 1
+        return generic.IndirectObject(numbers[key], 0, reader)
+
+    def detach(obj):
+        """Copy ``obj`` for writing, numbering the objects that are new to the file."""
+        if isinstance(obj, generic.IndirectObject):
+            if obj.pdf is reader:
+                return obj
+            return allocate((id(obj.pdf), obj.idnum), obj.get_object())
+        if isinstance(obj, generic.StreamObject):
+            # Streams must be indirect; merged page content is held inline
+            return allocate(('direct', id(obj)), obj)
+        if isinstance(obj, generic.DictionaryObject):
+            return generic.DictionaryObject({key: detach(value) for key, value in obj.items()})
+        if isinstance(obj, generic.ArrayObject):
+            return generic.ArrayObject(detach(value) for value in obj)
+        return obj
+
+    def detach_stream(stream):
+        if isinstance(stream, generic.DecodedStreamObject):
+            copy = stream.flate_encode()
+        else:
+            copy = generic.EncodedStreamObject()
+            copy._data = stream._data
+        for key, value in stream.items():
+            # The length is recomputed as the stream is written
+            if key == '/Length' or key in copy:
+                continue
+            copy[key] = detach(value)
+        return copy
+
+    for i in changed:
+        ref = pages[i].indirect_reference
+        pending.append((ref.idnum, ref.generation, pages[i]))
+
+    with stage('write'):
+        shutil.copyfile(input_path, output_path)
+        with open(output_path, 'ab') as out:
+            out.write(b'\n')
+            offsets = []
+            while pending:
+                number, generation, obj = pending.popleft()
+                offsets.append((number, generation, out.tell()))
+                if isinstance(obj, generic.StreamObject):
+                    obj = detach_stream(obj)
+                else:
+                    obj = detach(obj)
+                out.write(f'{number} {generation} obj\n'.encode())
+                obj.write_to_stream(out, None)
+                out.write(b'\nendobj\n')
+
+            trailer = generic.DictionaryObject()
+            for key in ('/Root', '/Info', '/ID'):
+                if key in reader.trailer:
+                    trailer[generic.NameObject(key)] = reader.trailer.raw_get(key)
+            trailer[generic.NameObject('/Prev')] = generic.NumberObject(prev)
+
+            xref_offset = out.tell()
+            if xref_stream:
+                write_xref_stream(out, offsets, next_number, trailer)
+            else:
+                trailer[generic.NameObject('/Size')] = generic.NumberObject(next_number)
+                # Sections conventionally restate the head of the free list
+                out.write(b'xref\n0 1\n0000000000 65535 f\r\n')
+                for number, generation, offset in sorted(offsets):
+                    out.write(f'{number} 1\n{offset:010d} {generation:05d} n\r\n'.encode())
+                out.write(b'trailer\n')
+                trailer.write_to_stream(out, None)
+            out.write(f'\nstartxref\n{xref_offset}\n%%EOF\n'.encode())
+    return True
+
+def write_xref_stream(out, offsets, size, trailer):
+    """Write a cross-reference stream for ``offsets``, numbered ``size``."""
+    generic = PyPDF2.generic
+    entries = sorted(offsets + [(size, 0, out.tell())])
+    offset_width = max(4, (entries[-1][2].bit_length() + 7) // 8)
+
+    # Entry 0 is the head of the free list, as in a cross-reference table
+    index = generic.ArrayObject([generic.NumberObject(0), generic.NumberObject(1)])
+    rows = io.BytesIO()
+    rows.write(b'\x00' + bytes(offset_width) + b'\xff\xff')
+    for number, generation, offset in entries:
+        index.extend([generic.NumberObject(number), generic.NumberObject(1)])
+        rows.write(b'\x01' + offset.to_bytes(offset_width, 'big') + generation.to_bytes(2, 'big'))
+
+    stream = generic.DecodedStreamObject()
+    stream.set_data(rows.getvalue())
+    stream = stream.flate_encode()
+    stream.update(trailer)
+    stream[generic.NameObject('/Type')] = generic.NameObject('/XRef')
+    stream[generic.NameObject('/Size')] = generic.NumberObject(size + 1)
+    stream[generic.NameObject('/Index')] = index
+    stream[generic.NameObject('/W')] = generic.ArrayObject(
+        generic.NumberObject(width) for width in (1, offset_width, 2))
+    out.write(f'{size} 0 obj\n'.encode())
+    stream.write_to_stream(out, None)
+    out.write(b'\nendobj\n')
+
+def mediabox_size(page):
+    return (float(page.mediabox.width), float(page.mediabox.height))
+
+class OverlayBatch:
+    """Collects overlay drawings and renders them as one reportlab document.
+
+    Each overlay becomes one page of a single canvas, so fonts are embedded
+    once and the result is parsed by PyPDF2 once, however many pages are
+    stamped. Overlays registered under the same ``key`` are rendered once
+    and shared between pages.
+    """
+
+    def __init__(self):
+        self._overlays = []
+        self._slots = {}
+
+    def add(self, pagesize, draw, key=None):
+        """Register ``draw(canvas)`` on a page of ``pagesize`` and return its slot."""
+        if key is not None and key in self._slots:
+            return self._slots[key]
+        
+        slot = len(self._overlays)
+        self._overlays.append((pagesize, draw))
+        if key is not None:
+            self._slots[key] = slot
+        return slot
+
+    def render(self):
+        """Render all overlays and return their pages, indexed by slot."""
+        if not self._overlays:
+            return []
+        
+        with stage('render'):
+            packet = io.BytesIO()
+            can = canvas.Canvas(packet)
+            
+            for pagesize, draw in self._overlays:
+                can.setPageSize(pagesize)
+                draw(can)
+                can.showPage()
+            
+            can.save()
+            packet.seek(0)
+            return PyPDF2.PdfReader(packet).pages
+
+def stamp_pdf_pages(pages, overlay_for_page):
+    """Merge overlays onto ``pages`` in place; return the indexes of the pages stamped.
+
+    ``overlay_for_page(batch, index, page)`` registers the page's overlay
+    with ``batch`` and returns its slot, or returns ``None`` to leave the
+    page untouched. All overlays are rendered in one pass before merging.
+    """
+    batch = OverlayBatch()
+    slots = [overlay_for_page(batch, i, page) for i, page in enumerate(pages)]
+    overlays = batch.render()
+    
+    with stage('stamp'):
+        for page, slot in zip(pages, slots):
+            if slot is not None:
+                page.merge_page(overlays[slot])
+                # merge_page leaves a parsed ContentStream, which is re-serialized
+                # every time its data is read; keep the bytes instead
+                page[PyPDF2.generic.NameObject('/Contents')] = _content_stream(page['/Contents'].get_data())
+    
+    return [i for i, slot in enumerate(slots) if slot is not None]
+
+def parse_page_selection(spec):
+    """Parse a page selection such as ``"1-3, 8, 10-"``, ``"odd"`` or ``"every 3"``.
+
+    Returns a list of ``(first, last, step)`` ranges of 1-based page numbers,
+    with ``last`` None for the end of the document, or None for a blank
+    selection, which means every page.
+    """
+    if not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(','):
+        item = part.strip().lower()
+        every = re.fullmatch(r'every\s*(\d+)(?:st|nd|rd|th)?', item)
+        span = re.fullmatch(r'(\d*)\s*-\s*(\d*)', item)
+        if item == 'odd':
+            ranges.append((1, None, 2))
+        elif item == 'even':
+            ranges.append((2, None, 2))
+        elif every and int(every.group(1)) > 0:
+            ranges.append((1, None, int(every.group(1))))
+        elif item.isdigit() and int(item) > 0:
+            ranges.append((int(item), int(item), 1))
+        elif span and (span.group(1) or span.group(2)):
+            first = int(span.group(1) or 1)
+            last = int(span.group(2)) if span.group(2) else None
+            if first < 1 or (last is not None and last < first):
+                raise ToolError(f'Invalid page selection: {part.strip()}')
+            ranges.append((first, last, 1))
+        else:
+            raise ToolError(f'Invalid page selection: {part.strip()}')
+    return ranges
+
+def select_pages(page_count, selection):
+    """Return the 0-based indexes of the pages ``selection`` picks."""
+    if selection is None:
+        return set(range(page_count))
+
+    selected = set()
+    for first, last, step in selection:
+        stop = page_count if last is None else min(last, page_count)
+        selected.update(range(first - 1, stop, step))
+    if not selected:
+        raise ToolError(f'No pages selected: the document has {page_count} pages')
+    return selected
+
+class ToolError(Exception):
+    """A problem with the request itself, reported to the client as a 400."""
+
+Upload = namedtuple('Upload', ['path', 'filename', 'sha256'])
+
+class Tool:
+    """A registered PDF tool: which uploads it takes and how to run it.
+
+    ``run(uploads, output_path, options)`` receives the uploads saved to
+    disk and the parsed options, and writes its result to ``output_path``.
+    ``options`` maps each form field the tool reads to its default; values
+    from the form are converted to the default's type. Tools with
+    ``min_files`` of None work on one file; given several, they run on each
+    one separately and return a ZIP (see write_bulk_zip). ``cacheable`` may
+    be a function of the parsed options. Only tools that ``accepts_locked``
+    take PDFs that need a password to open.
+
+    A ``streamed`` tool is registered with a generator instead,
+    ``stream(uploads, options, fileobj)``, which writes its output to
+    ``fileobj`` a piece at a time. It yields once when it has checked its
+    input and then after each piece, so a single-file request can be sent
+    while it is still being written (see send_streamed_result).
+    """
+
+    def __init__(self, name, run, output_prefix, output_ext, file_type, min_files,
+                 error_label, options, cacheable, accepts_locked, streamed):
+        self.name = name
+        self.stream = run if streamed else None
+        self.run = self.run_to_file if streamed else run
+        self.output_prefix = output_prefix
+        self.output_ext = output_ext
+        self.file_type = file_type
+        self.min_files = min_files
+        self.error_label = error_label
+        self.options = options
+        self.cacheable = cacheable
+        self.accepts_locked = accepts_locked
+
+    def select_files(self, files):
+        """Return the uploads this tool uses, or raise ToolError."""
+        if self.min_files is None:
+            if not files:
+                raise ToolError('No PDF file provided')
+            if len(files) == 1:
+                if not allowed_file(files[0].filename, self.file_type):
+                    raise ToolError('Invalid PDF file')
+                self.check_upload(files[0])
+                return files
+        elif len(files) < self.min_files:
+            if self.min_files > 1:
+                raise ToolError(f'At least {self.min_files} PDF files required')
+            raise ToolError('No files provided')
+        
+        for file in files:
+            if not file.filename or not allowed_file(file.filename, self.file_type):
+                raise ToolError(f'Invalid file: {file.filename}')
+            self.check_upload(file)
+        return files
+
+    def run_to_file(self, uploads, output_path, options):
+        with open(output_path, 'wb') as output_file:
+            for _ in self.stream(uploads, options, output_file):
+                pass
+
+    def check_upload(self, file):
+        if not isinstance(file.stream, UploadFile):
+            return
+        file.stream.check()
+        # A file already seen by /inspect is known before any work starts
+        info = cached_inspection(file.stream.digest.hexdigest())
+        if info is not None and info['needs_password'] and not self.accepts_locked:
+            raise ToolError(f'{file.filename} is password protected; unlock it first')
+
+    def parse_options(self, form):
+        """Read this tool's options from ``form``, filling in defaults."""
+        options = {}
+        for key, default in self.options.items():
+            if key not in form:
+                options[key] = default
+                continue
+            value = form.get(key)
+            # Pipeline steps come from JSON, where a field can be null, a list or an object
+            if not isinstance(value, (str, int, float)):
+                raise ToolError(f'Invalid value for {key}: expected a single value')
+            try:
+                options[key] = type(default)(value)
+            except (TypeError, ValueError):
+                raise ToolError(f'Invalid value for {key}: {value}')
+        return options
+
+    def is_bulk(self, files):
+        """Whether ``files`` is a batch to be processed one file at a time."""
+        return self.min_files is None and len(files) > 1
+
+    def result_ext(self, files):
+        return '.zip' if self.is_bulk(files) else self.output_ext
+
+    def output_filename(self, ext=None):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return f'{self.output_prefix}_{timestamp}{ext or self.output_ext}'
+
+    def error_message(self, error):
+        if self.error_label is None:
+            return str(error)
+        return f'{self.error_label}: {str(error)}'
+
+TOOLS = {}
+
+def tool(name, output_prefix, output_ext='.pdf', file_type='pdf', min_files=None,
+         error_label='Processing failed', options=None, cacheable=True, accepts_locked=False,
+         streamed=False):
+    """Register the decorated function as the runner of tool ``name``."""
+    def register(run):
+        TOOLS[name] = Tool(name, run, output_prefix, output_ext, file_type, min_files,
+                           error_label, options or {}, cacheable, accepts_locked, streamed)
+        return run
+    return register
+
+# How many leading bytes are kept to recognise an upload's type. Readers
+# accept a PDF header anywhere in the first kilobyte.
+SNIFF_BYTES = 1024
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+IMAGE_SIGNATURES = (JPEG_SIGNATURE, b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a', b'BM')
+
+def matches_file_type(head, file_type):
+    if file_type == 'pdf':
+        return b'%PDF-' in head[:SNIFF_BYTES]
+    return head.startswith(IMAGE_SIGNATURES)
+
+class UploadFile:
+    """The file Werkzeug streams one uploaded file into.
+
+    Bytes go straight to a file in UPLOAD_DIR and are hashed as they are
+    written. When ``file_type`` is known, the upload is rejected with a
+    ToolError as soon as its first bytes show it is the wrong kind of file.
+    The file is deleted on close unless ``keep`` has claimed it.
+    """
+
+    def __init__(self, filename, file_type):
+        suffix = os.path.splitext(secure_filename(filename or ''))[1]
+        fd, self.name = tempfile.mkstemp(suffix=suffix, dir=app.config['UPLOAD_DIR'])
+        self.file = os.fdopen(fd, 'w+b')
+        self.filename = filename
+        self.file_type = file_type
+        self.digest = hashlib.sha256()
+        self.head = b''
+        self.checked = file_type is None
+        self.kept = False
+
+    def write(self, data):
+        if not self.checked:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self.check()
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def check(self):
+        """Raise ToolError unless the upload starts like a ``file_type`` file."""
+        if not self.checked:
+            if not matches_file_type(self.head, self.file_type):
+                raise ToolError(f'Invalid file: {self.filename}')
+            self.checked = True
+
+    def keep(self, directory=None):
+        """Claim the file on disk, moving it into ``directory`` if given."""
+        self.file.close()
+        self.kept = True
+        if directory is None:
+            return self.name
+        path = os.path.join(directory, os.path.basename(self.name))
+        shutil.move(self.name, path)
+        return path
+
+    def close(self):
+        self.file.close()
+        if not self.kept:
+            try:
+                os.unlink(self.name)
+            except OSError:
+                pass
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+# Routes other than tools that take uploads, and the type of file they take
+UPLOAD_ROUTES = {
+    'inspect': 'pdf',
+}
+
+class UploadRequest(Request):
+    """Request that streams file uploads to disk through UploadFile."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_files = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        # Tool routes are named after their tool; job routes name it in the URL
+        name = (self.view_args or {}).get('name', self.path.strip('/'))
+        tool = TOOLS.get(name)
+        upload = UploadFile(filename, tool.file_type if tool else UPLOAD_ROUTES.get(name))
+        self.upload_files.append(upload)
+        return upload
+
+    def close(self):
+        # Also covers uploads a failed parse never handed to request.files
+        for upload in self.upload_files:
+            upload.close()
+        super().close()
+
+app.request_class = UploadRequest
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    limit = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'error': f'Upload too large (limit {limit}MB)'}), 413
+
+def save_uploads(files, directory=None):
+    """Claim ``files`` on disk, moving them into ``directory`` if given.
+
+    Uploads streamed in by UploadRequest are already on disk and hashed;
+    anything else is copied and hashed here.
+    """
+    uploads = []
+    try:
+        for file in files:
+            if isinstance(file.stream, UploadFile):
+                path = file.stream.keep(directory)
+                uploads.append(Upload(path, file.filename, file.stream.digest.hexdigest()))
+                continue
+            suffix = os.path.splitext(secure_filename(file.filename))[1]
+            digest = hashlib.sha256()
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=directory) as temp_input:
+                uploads.append(Upload(temp_input.name, file.filename, None))
+                for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    temp_input.write(chunk)
+            uploads[-1] = uploads[-1]._replace(sha256=digest.hexdigest())
+    except Exception:
+        remove_uploads(uploads)
+        raise
+    return uploads
+
+def remove_uploads(uploads):
+    for upload in uploads:
+        try:
+            os.unlink(upload.path)
+        except OSError:
             pass
-        return response
+
+def handle_tool_request(name):
+    """Run tool ``name`` on the current request and send back its output."""
+    tool = TOOLS[name]
+    profile_id = new_profile_id()
+    try:
+        with instrument(tool, profile_id) as stats:
+            response = run_tool_request(tool, stats)
+    except ToolError as e:
+        return jsonify({'error': str(e)}), 400
+    except ServerBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({'error': tool.error_message(e)}), 500
+    
+    response.headers['Server-Timing'] = stats.server_timing()
+    if profile_id:
+        response.headers['X-Profile-Url'] = f'/profiles/{profile_id}'
+    return response
+
+def run_tool_request(tool, stats):
+    with stage('upload'):
+        files = tool.select_files(request.files.getlist('files'))
+    options = tool.parse_options(request.form)
+    if tool.is_bulk(files):
+        return send_bulk_zip(tool, files, options)
+    
+    with stage('save'):
+        uploads = save_uploads(files)
+    try:
+        cache_key = result_cache_key(tool, uploads, options)
+        cached_path = cache_lookup(cache_key, tool)
+        if cached_path is not None:
+            response = send_result(cached_path, tool.output_filename())
+            response.headers.update(size_headers(uploads, cached_path))
+            return response
+        
+        if tool.stream is not None:
+            response = send_streamed_result(tool, uploads, options, cache_key)
+            # The response removes the uploads once it has been sent
+            uploads = []
+            return response
+        
+        # The result is kept as a finished job, so a dropped download can
+        # be resumed from its result URL until the job expires
+        with admitted(tool, uploads):
+            job_id = create_job_record(tool, tool.output_ext, status='running', started_at=time.time())
+            output_path = job_result_path(job_id)
+            # Touched while it runs, so a long run is not taken for a lost job
+            claim_job(job_id)
+            try:
+                tool.run(uploads, output_path, options)
+            except Exception:
+                release_job(job_id)
+                shutil.rmtree(job_dir(job_id), ignore_errors=True)
+                raise
+        try:
+            cache_store(cache_key, tool, output_path)
+            count_bytes(*result_sizes(uploads, output_path))
+            job = finish_job(job_id, tool, uploads, output_path, timings=stats.stages)
+        finally:
+            release_job(job_id)
+        headers = size_headers(uploads, output_path)
+    finally:
+        remove_uploads(uploads)
+    
+    response = send_result(output_path, job['filename'])
+    response.headers.update(headers)
+    response.headers['X-Result-Url'] = job_status(job)['result_url']
+    return response
+
+def run_tool(tool, uploads, options, output_path):
+    """Run ``tool`` into ``output_path``, reusing a cached result if there is one."""
+    cache_key = result_cache_key(tool, uploads, options)
+    cached_path = cache_lookup(cache_key, tool)
+    if cached_path is not None:
+        shutil.copyfile(cached_path, output_path)
+    else:
+        tool.run(uploads, output_path, options)
+        cache_store(cache_key, tool, output_path)
+    count_bytes(*result_sizes(uploads, output_path))
+
+def run_bulk_item(tool, upload, options, output_path):
+    with instrument(tool):
+        run_tool(tool, [upload], options, output_path)
+
+class ZipStream:
+    """Unseekable file for zipfile to write to.
+
+    ``take`` returns everything written since it was last called. Given a
+    ``copy``, everything is also written to that file.
+    """
+
+    def __init__(self, copy=None):
+        self.chunks = []
+        self.copy = copy
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        if self.copy is not None:
+            self.copy.write(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def bulk_output_names(tool, uploads):
+    """Name each upload's result after the upload, keeping names unique."""
+    names = []
+    for i, upload in enumerate(uploads):
+        stem = os.path.splitext(secure_filename(upload.filename))[0] or f'file_{i + 1}'
+        name = stem + tool.output_ext
+        copy = 1
+        while name in names:
+            copy += 1
+            name = f'{stem}_{copy}{tool.output_ext}'
+        names.append(name)
+    return names
+
+def write_bulk_zip(tool, uploads, options, fileobj, workdir):
+    """Run ``tool`` on each upload separately and write the results as a ZIP.
+
+    Up to BULK_WORKERS files are processed at a time, and each result is
+    added to the archive as soon as it is ready, then deleted. This is a
+    generator: it yields the number of files finished after each one, so
+    the caller can pass on what has been written. Files that fail are
+    reported in manifest.json instead of failing the batch.
+    """
+    names = bulk_output_names(tool, uploads)
+    manifest = [{'file': upload.filename, 'status': 'pending'} for upload in uploads]
+    executor = ThreadPoolExecutor(max_workers=app.config['BULK_WORKERS'], thread_name_prefix='pdf-bulk')
+    try:
+        # PDFs are mostly compressed already, so a light pass is enough
+        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+            futures = {}
+            for i, upload in enumerate(uploads):
+                output_path = os.path.join(workdir, f'bulk_{i}{tool.output_ext}')
+                futures[executor.submit(run_bulk_item, tool, upload, options, output_path)] = (i, output_path)
+            
+            for done, future in enumerate(as_completed(futures), 1):
+                i, output_path = futures[future]
+                try:
+                    future.result()
+                    archive.write(output_path, names[i])
+                    manifest[i].update(status='done', output=names[i])
+                except ToolError as e:
+                    manifest[i].update(status='failed', error=str(e))
+                except Exception as e:
+                    manifest[i].update(status='failed', error=tool.error_message(e))
+                finally:
+                    try:
+                        os.unlink(output_path)
+                    except OSError:
+                        pass
+                yield done
+            
+            failed = sum(entry['status'] == 'failed' for entry in manifest)
+            archive.writestr('manifest.json', json.dumps({
+                'tool': tool.name,
+                'succeeded': len(uploads) - failed,
+                'failed': failed,
+                'files': manifest,
+            }, indent=2))
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def send_bulk_zip(tool, files, options):
+    """Stream the ZIP of a bulk request while its files are still being processed."""
+    workdir = tempfile.mkdtemp(dir=app.config['UPLOAD_DIR'])
+    try:
+        uploads = save_uploads(files, workdir)
+        # The batch is admitted as a whole, until the response is closed
+        cost = admission_cost(uploads)
+        admit(tool, cost)
+    except Exception:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    
+    def generate():
+        sink = ZipStream()
+        batch = write_bulk_zip(tool, uploads, options, sink, workdir)
+        try:
+            for _ in batch:
+                yield sink.take()
+            yield sink.take()
+        finally:
+            # Also runs when the client goes away mid-download
+            batch.close()
+            release_admission(cost)
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    filename = tool.output_filename('.zip')
+    return app.response_class(generate(), mimetype='application/zip',
+                              headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+def send_streamed_result(tool, uploads, options, cache_key):
+    """Send the output of a streamed tool while it is being written.
+
+    Input errors are raised here, before anything is sent. The output is
+    also written to a job result, as for any other tool, so once it is
+    complete it is cached and can be downloaded again from X-Result-Url.
+    A run that fails part way can only cut the download short. The run
+    stays admitted until the response is closed.
+    """
+    cost = admission_cost(uploads)
+    admit(tool, cost)
+    try:
+        job_id = create_job_record(tool, tool.output_ext, status='running', started_at=time.time())
+    except Exception:
+        release_admission(cost)
+        raise
+    output_path = job_result_path(job_id)
+    # Touched until the response closes, however long the download takes
+    claim_job(job_id)
+    output_file = open(output_path, 'wb')
+    sink = ZipStream(output_file)
+    pieces = tool.stream(uploads, options, sink)
+    try:
+        next(pieces)
+    except Exception:
+        pieces.close()
+        output_file.close()
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
+        release_job(job_id)
+        release_admission(cost)
+        raise
+    
+    def generate():
+        finished = False
+        try:
+            with instrument(tool) as stats:
+                yield sink.take()
+                for _ in pieces:
+                    yield sink.take()
+                yield sink.take()
+                output_file.close()
+                cache_store(cache_key, tool, output_path)
+                count_bytes(*result_sizes(uploads, output_path))
+            finish_job(job_id, tool, uploads, output_path, timings=stats.stages)
+            finished = True
+        finally:
+            # Also runs when the client goes away mid-download
+            pieces.close()
+            output_file.close()
+            release_job(job_id)
+            release_admission(cost)
+            remove_uploads(uploads)
+            if not finished:
+                shutil.rmtree(job_dir(job_id), ignore_errors=True)
     
-    return send_file(file_path, as_attachment=True, download_name=filename)
+    filename = tool.output_filename()
+    response = app.response_class(generate(), mimetype=mimetypes.guess_type(filename)[0],
+                                  headers={'Content-Disposition': f'attachment; filename={filename}'})
+    response.headers['X-Result-Url'] = f'/jobs/{job_id}/result'
+    return response
+
+def result_sizes(uploads, output_path):
+    """Return the total size of the uploads and the size of the output."""
+    return sum(os.path.getsize(upload.path) for upload in uploads), os.path.getsize(output_path)
+
+def size_headers(uploads, output_path):
+    """Report how the output's size compares with the uploads'."""
+    input_size, output_size = result_sizes(uploads, output_path)
+    return {
+        'X-Input-Size': str(input_size),
+        'X-Output-Size': str(output_size),
+        'X-Bytes-Saved': str(input_size - output_size),
+    }
+
+class ServerBusy(Exception):
+    """The server has no room for the request now, reported as a 503."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# Estimated memory a tool run needs: a fixed overhead plus some for every
+# byte and page of input (measured with benchmarks/run_all.py, peak RSS)
+ADMISSION_BASE_COST = 8 * 1024 * 1024
+ADMISSION_BYTE_COST = 5
+ADMISSION_PAGE_COST = 128 * 1024
+
+# Admission is counted across every gunicorn worker, not per process. The
+# condition and slots are created here, in the preloaded master, and every
+# worker inherits them when it forks. Each process keeps its runs, memory and
+# waiting requests in a slot of its own, so a worker that dies mid-run gives
+# its share of the budget back once its slot is reclaimed.
+ADMISSION_SLOTS = 64
+SLOT_PID, SLOT_RUNS, SLOT_COST, SLOT_QUEUED = range(4)
+SLOT_SIZE = 4
+
+_admission = multiprocessing.Condition()
+_admission_slots = multiprocessing.RawArray('q', ADMISSION_SLOTS * SLOT_SIZE)
+# This process's waiting requests, in arrival order
+_admission_queue = deque()
+
+def process_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def admission_slot():
+    """The offset of this process's slot, claiming one if it has none.
+
+    Called with _admission held.
+    """
+    pid = os.getpid()
+    free = None
+    for base in range(0, ADMISSION_SLOTS * SLOT_SIZE, SLOT_SIZE):
+        owner = _admission_slots[base + SLOT_PID]
+        if owner == pid:
+            return base
+        if free is None and not process_alive(owner):
+            free = base
+    if free is None:
+        raise Exception(f'More than {ADMISSION_SLOTS} processes are serving requests')
+    _admission_slots[free:free + SLOT_SIZE] = [pid, 0, 0, 0]
+    return free
+
+def admission_totals():
+    """Runs, memory and waiting requests summed over every live process.
+
+    Called with _admission held.
+    """
+    runs = cost = queued = 0
+    for base in range(0, ADMISSION_SLOTS * SLOT_SIZE, SLOT_SIZE):
+        pid = _admission_slots[base + SLOT_PID]
+        if not pid:
+            continue
+        if not process_alive(pid):
+            _admission_slots[base:base + SLOT_SIZE] = [0, 0, 0, 0]
+            continue
+        runs += _admission_slots[base + SLOT_RUNS]
+        cost += _admission_slots[base + SLOT_COST]
+        queued += _admission_slots[base + SLOT_QUEUED]
+    return runs, cost, queued
+
+def admission_cost(uploads):
+    """Estimate the memory a run on ``uploads`` needs, from their size and pages."""
+    cost = 0
+    for upload in uploads:
+        cost += (ADMISSION_BASE_COST + os.path.getsize(upload.path) * ADMISSION_BYTE_COST
+                 + upload_page_count(upload) * ADMISSION_PAGE_COST)
+    return cost
+
+def upload_page_count(upload):
+    """The page count /inspect found for ``upload``, or a quick count of our own."""
+    info = cached_inspection(upload.sha256) if upload.sha256 else None
+    if info is not None and info['pages']:
+        return info['pages']
+    if not pymupdf_available():
+        return 1
+    try:
+        with fitz.open(upload.path) as doc:
+            return max(1, doc.page_count)
+    except Exception:
+        return 1
+
+def admission_fits(cost):
+    runs, used, _ = admission_totals()
+    if runs >= app.config['ADMISSION_MAX_RUNNING']:
+        return False
+    # A run bigger than the whole budget still gets to run on its own
+    return runs == 0 or used + cost <= app.config['ADMISSION_BUDGET_BYTES']
+
+def admit(tool, cost, wait=True):
+    """Wait for room to start a run of estimated ``cost``, then count it in.
+
+    Runs start in arrival order within each worker process. Unless ``wait``
+    is False (for background jobs, which are queued already and wait as
+    long as it takes), raises ServerBusy when ADMISSION_MAX_QUEUE runs are
+    waiting already or the run has not started within ADMISSION_WAIT
+    seconds. Call release_admission with the same ``cost`` when the run is
+    over.
+    """
+    retry_after = app.config['ADMISSION_RETRY_AFTER']
+    started = time.monotonic()
+    deadline = started + app.config['ADMISSION_WAIT']
+    ticket = object()
+    with stage('admission'), _admission:
+        slot = admission_slot()
+        queued = admission_totals()[2]
+        if (wait and (queued or not admission_fits(cost))
+                and queued >= app.config['ADMISSION_MAX_QUEUE']):
+            increment_metric('pdf_master_admission_rejected_total', tool=tool.name)
+            raise ServerBusy('Server is busy, try again shortly', retry_after)
+        
+        _admission_queue.append(ticket)
+        _admission_slots[slot + SLOT_QUEUED] += 1
+        try:
+            record_admission_metrics()
+            while _admission_queue[0] is not ticket or not admission_fits(cost):
+                remaining = deadline - time.monotonic()
+                if wait and remaining <= 0:
+                    increment_metric('pdf_master_admission_rejected_total', tool=tool.name)
+                    raise ServerBusy('Server is busy, try again shortly', retry_after)
+                _admission.wait(remaining if wait else None)
+            _admission_slots[slot + SLOT_RUNS] += 1
+            _admission_slots[slot + SLOT_COST] += cost
+        finally:
+            _admission_queue.remove(ticket)
+            _admission_slots[slot + SLOT_QUEUED] -= 1
+            record_admission_metrics()
+            # The next in line, here or in another worker, may fit now
+            _admission.notify_all()
+    observe_metric('pdf_master_admission_wait_seconds', time.monotonic() - started, tool=tool.name)
+
+def release_admission(cost):
+    with _admission:
+        slot = admission_slot()
+        _admission_slots[slot + SLOT_RUNS] -= 1
+        _admission_slots[slot + SLOT_COST] -= cost
+        record_admission_metrics()
+        _admission.notify_all()
+
+@contextmanager
+def admitted(tool, uploads, wait=True):
+    """Run the enclosed block once admit lets a run on ``uploads`` start."""
+    cost = admission_cost(uploads)
+    admit(tool, cost, wait)
+    try:
+        yield
+    finally:
+        release_admission(cost)
+
+def admission_status():
+    """Admission across all worker processes."""
+    with _admission:
+        runs, used, queued = admission_totals()
+    return {
+        'running': runs,
+        'queued': queued,
+        'budget_bytes': app.config['ADMISSION_BUDGET_BYTES'],
+        'used_bytes': used,
+        'saturated': queued >= app.config['ADMISSION_MAX_QUEUE'],
+    }
+
+def record_admission_metrics():
+    # Called with _admission held
+    runs, used, queued = admission_totals()
+    set_metric('pdf_master_admission_running', runs)
+    set_metric('pdf_master_admission_queued', queued)
+    set_metric('pdf_master_admission_used_bytes', used)
+    set_metric('pdf_master_admission_budget_bytes', app.config['ADMISSION_BUDGET_BYTES'])
+
+@app.route('/ready')
+def ready():
+    """Readiness for a load balancer: 503 while the admission queue is full."""
+    status = admission_status()
+    return jsonify(status), 503 if status['saturated'] else 200
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+METRIC_HELP = {
+    'pdf_master_cache_hits_total': 'Tool requests answered from the result cache.',
+    'pdf_master_cache_misses_total': 'Cacheable tool requests that had to run the tool.',
+    'pdf_master_cache_evictions_total': 'Results evicted from the result cache.',
+    'pdf_master_backend_import_seconds': 'Time taken to import each backend library.',
+    'pdf_master_inspect_cache_hits_total': 'Inspections answered from the inspection cache.',
+    'pdf_master_inspect_cache_misses_total': 'Inspections that had to read the PDF.',
+    'pdf_master_extract_cache_hits_total': 'Pages whose text blocks came from the extraction cache.',
+    'pdf_master_extract_cache_misses_total': 'Pages whose text blocks had to be extracted.',
+    'pdf_master_http_request_seconds': 'Time taken to answer each request, by route and status.',
+    'pdf_master_stage_seconds': 'Time spent in each stage of a tool run.',
+    'pdf_master_pages_total': 'Pages read by each tool.',
+    'pdf_master_input_bytes_total': 'Bytes uploaded to each tool.',
+    'pdf_master_output_bytes_total': 'Bytes produced by each tool.',
+    'pdf_master_worker_peak_rss_bytes': 'Peak resident memory of the pool workers a tool run used.',
+    'pdf_master_queue_wait_seconds': 'Time jobs waited in the queue before starting.',
+    'pdf_master_jobs_total': 'Background jobs finished, by outcome.',
+    'pdf_master_jobs_queued': 'Background jobs waiting for a job worker.',
+    'pdf_master_admission_running': 'Tool runs admitted and not yet finished.',
+    'pdf_master_admission_queued': 'Tool runs waiting to be admitted.',
+    'pdf_master_admission_used_bytes': 'Estimated memory of the admitted tool runs.',
+    'pdf_master_admission_budget_bytes': 'Estimated memory the admitted tool runs may use.',
+    'pdf_master_admission_wait_seconds': 'Time tool runs waited to be admitted.',
+    'pdf_master_admission_rejected_total': 'Tool requests turned away with a 503.',
+}
+
+# Metrics not listed here are counters
+METRIC_TYPES = {
+    'pdf_master_backend_import_seconds': 'gauge',
+    'pdf_master_http_request_seconds': 'summary',
+    'pdf_master_stage_seconds': 'summary',
+    'pdf_master_worker_peak_rss_bytes': 'summary',
+    'pdf_master_queue_wait_seconds': 'summary',
+    'pdf_master_jobs_queued': 'gauge',
+    'pdf_master_admission_running': 'gauge',
+    'pdf_master_admission_queued': 'gauge',
+    'pdf_master_admission_used_bytes': 'gauge',
+    'pdf_master_admission_budget_bytes': 'gauge',
+    'pdf_master_admission_wait_seconds': 'summary',
+}
+
+def increment_metric(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _metrics[key] = _metrics.get(key, 0) + value
+
+def set_metric(name, value, **labels):
+    with _metrics_lock:
+        _metrics[(name, tuple(sorted(labels.items())))] = value
+
+def observe_metric(name, value, **labels):
+    """Add one observation to summary ``name`` (its _sum and _count samples)."""
+    key = tuple(sorted(labels.items()))
+    with _metrics_lock:
+        _metrics[(name + '_sum', key)] = _metrics.get((name + '_sum', key), 0) + value
+        _metrics[(name + '_count', key)] = _metrics.get((name + '_count', key), 0) + 1
+
+def metric_family(sample_name):
+    for suffix in ('_sum', '_count'):
+        base = sample_name[:-len(suffix)]
+        if sample_name.endswith(suffix) and METRIC_TYPES.get(base) == 'summary':
+            return base
+    return sample_name
+
+def render_metrics():
+    """Render all metrics in the Prometheus text exposition format."""
+    with _metrics_lock:
+        samples = sorted(_metrics.items())
+    lines = []
+    for name in sorted({metric_family(name) for (name, _), _ in samples}):
+        if name in METRIC_HELP:
+            lines.append(f'# HELP {name} {METRIC_HELP[name]}')
+        lines.append(f'# TYPE {name} {METRIC_TYPES.get(name, "counter")}')
+        for (sample_name, labels), value in samples:
+            if metric_family(sample_name) == name:
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'{sample_name}{{{label_text}}} {value}' if label_text else f'{sample_name} {value}')
+    return '\n'.join(lines) + '\n'
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed responses (bulk ZIPs) are timed up to their first byte
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    observe_metric('pdf_master_http_request_seconds', time.perf_counter() - g.request_started,
+                   route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    # Other workers admit and release too; report the admission gauges as of now
+    with _admission:
+        record_admission_metrics()
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@app.route('/profiles/<profile_id>')
+def get_profile(profile_id):
+    """Report a profiled request: its own thread and any pool tasks it ran."""
+    profile_dir = app.config['PROFILE_DIR']
+    paths = []
+    if profile_dir and re.fullmatch(r'[0-9a-f]{32}', profile_id):
+        paths = sorted(glob.glob(os.path.join(profile_dir, profile_id + '*.prof')))
+    if not paths:
+        return jsonify({'error': 'Profile not found'}), 404
+    
+    report = io.StringIO()
+    pstats.Stats(*paths, stream=report).sort_stats('cumulative').print_stats(60)
+    return report.getvalue(), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+_cache_lock = threading.Lock()
+
+def result_cache_key(tool, uploads, options):
+    """Key a tool result by the tool, its options and the uploaded bytes.
+
+    Returns None when the tool's output must not be cached.
+    """
+    cacheable = tool.cacheable(options) if callable(tool.cacheable) else tool.cacheable
+    if not cacheable or app.config['RESULT_CACHE_BYTES'] <= 0:
+        return None
+    key = hashlib.sha256(tool.name.encode())
+    for upload in uploads:
+        key.update(upload.sha256.encode())
+    key.update(json.dumps(options, sort_keys=True).encode())
+    return key.hexdigest()
+
+def cache_lookup(key, tool):
+    """Return the cached result for ``key``, or None on a miss."""
+    if key is None:
+        return None
+    path = os.path.join(app.config['RESULT_CACHE_DIR'], key + tool.output_ext)
+    try:
+        # The modification time doubles as the last-used time for LRU eviction
+        os.utime(path)
+    except OSError:
+        increment_metric('pdf_master_cache_misses_total', tool=tool.name)
+        return None
+    increment_metric('pdf_master_cache_hits_total', tool=tool.name)
+    return path
+
+def cache_store(key, tool, output_path):
+    if key is None:
+        return
+    cache_dir = app.config['RESULT_CACHE_DIR']
+    os.makedirs(cache_dir, exist_ok=True)
+    
+    temp_path = os.path.join(cache_dir, f'.{key}.{threading.get_ident()}')
+    shutil.copyfile(output_path, temp_path)
+    os.replace(temp_path, os.path.join(cache_dir, key + tool.output_ext))
+    
+    with _cache_lock:
+        entries = []
+        for entry in os.scandir(cache_dir):
+            if entry.is_file() and not entry.name.startswith('.'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= app.config['RESULT_CACHE_BYTES']:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            increment_metric('pdf_master_cache_evictions_total')
+
+# Inspections are small, so the most recent ones are kept in memory by content hash
+INSPECT_CACHE_ENTRIES = 1024
+_inspections = OrderedDict()
+_inspect_lock = threading.Lock()
+
+def cached_inspection(sha256):
+    with _inspect_lock:
+        info = _inspections.get(sha256)
+        if info is not None:
+            _inspections.move_to_end(sha256)
+        return info
+
+def inspect_upload(upload):
+    """Return what /inspect reports about ``upload``, reading the PDF only once."""
+    info = cached_inspection(upload.sha256)
+    if info is not None:
+        increment_metric('pdf_master_inspect_cache_hits_total')
+        return dict(info, filename=upload.filename, cached=True)
+    
+    increment_metric('pdf_master_inspect_cache_misses_total')
+    try:
+        info = inspect_pdf(upload.path)
+    except Exception:
+        raise ToolError(f'Invalid file: {upload.filename}')
+    info.update(size=os.path.getsize(upload.path), sha256=upload.sha256)
+    with _inspect_lock:
+        _inspections[upload.sha256] = info
+        while len(_inspections) > INSPECT_CACHE_ENTRIES:
+            _inspections.popitem(last=False)
+    return dict(info, filename=upload.filename, cached=False)
+
+def inspect_pdf(path):
+    """Describe the PDF at ``path`` from its trailer, page tree and resources.
+
+    Content streams are not parsed: images are counted from what the pages'
+    resources (and the forms they use) refer to, and a page is taken to
+    have text if it uses a font. A PDF that needs a password reports only
+    that.
+    """
+    info = {'pages': None, 'page_sizes': [], 'encrypted': False, 'needs_password': False,
+            'images': None, 'has_text': None}
+    sizes = {}
+    images = set()
+    has_text = False
+    
+    if pymupdf_available():
+        with fitz.open(path) as doc:
+            if doc.needs_pass:
+                info['encrypted'] = info['needs_password'] = True
+                return info
+            # Files with only an owner password open without one
+            info['encrypted'] = bool(doc.metadata.get('encryption'))
+            for i, page in enumerate(doc):
+                size = (round(page.rect.width, 1), round(page.rect.height, 1))
+                sizes[size] = sizes.get(size, 0) + 1
+                images.update(image[0] for image in doc.get_page_images(i))
+                has_text = has_text or bool(doc.get_page_fonts(i))
+    else:
+        reader = PyPDF2.PdfReader(path)
+        info['encrypted'] = reader.is_encrypted
+        if reader.is_encrypted and not reader.decrypt(''):
+            info['needs_password'] = True
+            return info
+        for page in reader.pages:
+            width, height = (float(v) for v in (page.cropbox.width, page.cropbox.height))
+            if page.get('/Rotate', 0) % 180:
+                width, height = height, width
+            size = (round(width, 1), round(height, 1))
+            sizes[size] = sizes.get(size, 0) + 1
+            has_text = resource_usage(page.get('/Resources'), images, set()) or has_text
+    
+    info['pages'] = sum(sizes.values())
+    info['page_sizes'] = [{'width': width, 'height': height, 'pages': count}
+                          for (width, height), count in sorted(sizes.items(), key=lambda item: -item[1])]
+    info['images'] = len(images)
+    info['has_text'] = has_text
+    return info
+
+def resource_usage(resources, images, seen):
+    """Add the images ``resources`` draw to ``images``; return whether they use fonts."""
+    resources = resources.get_object() if resources is not None else None
+    if not isinstance(resources, PyPDF2.generic.DictionaryObject):
+        return False
+    
+    uses_fonts = bool(resources.get('/Font'))
+    xobjects = resources.get('/XObject') or {}
+    for name in xobjects:
+        ref = xobjects.raw_get(name)
+        key = (ref.idnum, ref.generation) if isinstance(ref, PyPDF2.generic.IndirectObject) else id(ref)
+        if key in seen:
+            continue
+        seen.add(key)
+        xobject = ref.get_object()
+        if xobject.get('/Subtype') == '/Image':
+            images.add(key)
+        elif xobject.get('/Subtype') == '/Form':
+            uses_fonts = resource_usage(xobject.get('/Resources'), images, seen) or uses_fonts
+    return uses_fonts
+
+@app.route('/inspect', methods=['POST'])
+def inspect():
+    """Report page count, page sizes, encryption, images and text for each PDF."""
+    try:
+        # The body is parsed here, and UploadFile rejects non-PDFs as it arrives
+        files = request.files.getlist('files')
+        if not files:
+            raise ToolError('No PDF file provided')
+        for file in files:
+            if not allowed_file(file.filename, 'pdf'):
+                raise ToolError(f'Invalid file: {file.filename}')
+            if isinstance(file.stream, UploadFile):
+                file.stream.check()
+        
+        uploads = save_uploads(files)
+        try:
+            results = [inspect_upload(upload) for upload in uploads]
+        finally:
+            remove_uploads(uploads)
+    except ToolError as e:
+        return jsonify({'error': str(e)}), 400
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({'error': f'Inspect failed: {str(e)}'}), 500
+    
+    return jsonify({'files': results})
 
 @app.route('/')
 def index():
@@ -48,295 +1915,575 @@ def static_files(filename):
 
 @app.route('/merge-pdf', methods=['POST'])
 def merge_pdf():
-    try:
-        files = request.files.getlist('files')
-        if len(files) < 2:
-            return jsonify({'error': 'At least 2 PDF files required'}), 400
-        
-        for file in files:
-            if not allowed_file(file.filename, 'pdf'):
-                return jsonify({'error': f'Invalid file: {file.filename}'}), 400
-        
+    return handle_tool_request('merge-pdf')
+
+@tool('merge-pdf', 'merged_pdf', min_files=2, error_label=None)
+def run_merge_pdf(uploads, output_path, options):
+    input_paths = [upload.path for upload in uploads]
+    run_pdf_task(merge_pdf_files, input_paths, output_path, app.config['MERGE_FLUSH_BYTES'])
+
+def merge_pdf_files(input_paths, output_path, flush_bytes=None):
+    """Merge the PDFs at ``input_paths`` into ``output_path``.
+
+    With PyMuPDF the output is built on disk: inputs are appended until about
+    ``flush_bytes`` of input has been copied, then the pending pages are
+    written with an incremental save and the output is reopened, which drops
+    the copied objects from memory. insert_pdf does not copy outlines, so each
+    input's bookmarks are collected, moved to where its pages landed, and set
+    on the output at the end. Without PyMuPDF the inputs are merged with
+    PyPDF2, reading pages lazily from the spooled files.
+    """
+    if not pymupdf_available():
         merger = PyPDF2.PdfMerger()
-        
-        for file in files:
-            merger.append(file)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'merged_pdf_{timestamp}.pdf'
-        output_path = tempfile.mktemp(suffix='.pdf')
-        
-        with open(output_path, 'wb') as output_file:
+        with stage('merge'):
+            for path in input_paths:
+                merger.append(path)
+        count_pages(len(merger.pages))
+        with stage('write'), open(output_path, 'wb') as output_file:
             merger.write(output_file)
-        
         merger.close()
-        
-        return send_file_and_cleanup(output_path, output_filename)
+        return
     
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    if flush_bytes is None:
+        flush_bytes = app.config['MERGE_FLUSH_BYTES']
+    
+    out = fitz.open()
+    on_disk = False
+    pending = 0
+    toc = []
+    offset = 0
+    try:
+        for path in input_paths:
+            with stage('merge'), fitz.open(path) as src:
+                out.insert_pdf(src)
+                count_pages(len(src))
+                # Bookmarks without a target page (-1) keep it
+                toc.extend([level, title, page + offset if page > 0 else page]
+                           for level, title, page in src.get_toc())
+                offset += len(src)
+            pending += os.path.getsize(path)
+            
+            if pending >= flush_bytes:
+                if on_disk:
+                    out.saveIncr()
+                else:
+                    out.save(output_path, deflate=True)
+                    on_disk = True
+                out.close()
+                out = fitz.open(output_path)
+                pending = 0
+        
+        if toc:
+            out.set_toc(toc)
+        if not on_disk:
+            out.save(output_path, deflate=True)
+        elif pending or toc:
+            out.saveIncr()
+    finally:
+        out.close()
 
 @app.route('/jpg-to-pdf', methods=['POST'])
 def jpg_to_pdf():
-    try:
-        files = request.files.getlist('files')
-        page_size = request.form.get('pageSize', 'A4')
-        orientation = request.form.get('orientation', 'portrait')
-        
-        if not files or len(files) == 0:
-            return jsonify({'error': 'No files provided'}), 400
-        
-        for file in files:
-            if not file.filename or not allowed_file(file.filename, 'image'):
-                return jsonify({'error': f'Invalid file: {file.filename}'}), 400
-        
-        if page_size == 'A4':
-            page_dims = A4
-        elif page_size == 'Letter':
-            page_dims = letter
-        else:
-            page_dims = A4
-        
-        if orientation == 'landscape':
-            page_dims = (page_dims[1], page_dims[0])
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'images_to_pdf_{timestamp}.pdf'
-        output_path = tempfile.mktemp(suffix='.pdf')
-        
-        c = canvas.Canvas(output_path, pagesize=page_dims)
-        page_width, page_height = page_dims
-        
-        for i, file in enumerate(files):
-            try:
-                temp_input = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1])
-                file.save(temp_input.name)
-                temp_input.close()
-                
-                img = Image.open(temp_input.name)
-                
-                if img.mode != 'RGB':
-                    if img.mode in ('RGBA', 'LA'):
-                        background = Image.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'RGBA':
-                            background.paste(img, mask=img.split()[-1])
-                        else:
-                            background.paste(img)
-                        img = background
-                    else:
-                        img = img.convert('RGB')
-                
-                img_width, img_height = img.size
-                
-                scale_x = (page_width - 40) / img_width
-                scale_y = (page_height - 40) / img_height
-                scale = min(scale_x, scale_y)
-                
-                new_width = img_width * scale
-                new_height = img_height * scale
-                
-                x = (page_width - new_width) / 2
-                y = (page_height - new_height) / 2
-                
-                temp_output = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-                img.save(temp_output.name, 'JPEG', quality=95)
-                temp_output.close()
-                
-                c.drawImage(temp_output.name, x, y, new_width, new_height)
-                c.showPage()
-                
-                os.unlink(temp_input.name)
-                os.unlink(temp_output.name)
-                    
-            except Exception as img_error:
-                return jsonify({'error': f'Error processing image {file.filename}: {str(img_error)}'}), 500
-        
+    return handle_tool_request('jpg-to-pdf')
+
+@tool('jpg-to-pdf', 'images_to_pdf', file_type='image', min_files=1,
+      error_label='JPG to PDF conversion failed',
+      options={'pageSize': 'A4', 'orientation': 'portrait', 'targetDpi': 0})
+def run_jpg_to_pdf(uploads, output_path, options):
+    run_pdf_task(images_to_pdf, uploads, output_path, options['pageSize'],
+                 options['orientation'], options['targetDpi'])
+
+def images_to_pdf(uploads, output_path, page_size, orientation, target_dpi=0, jpeg_quality=85):
+    """Lay out one image per page, centred with a 20pt margin.
+
+    With a positive ``target_dpi`` each image is downsampled to the pixels
+    its box on the page needs at that resolution. Images are decoded and
+    scaled on a thread pool while pages are added in upload order.
+    """
+    if page_size == 'A4':
+        page_dims = A4
+    elif page_size == 'Letter':
+        page_dims = letter
+    else:
+        page_dims = A4
+    
+    if orientation == 'landscape':
+        page_dims = (page_dims[1], page_dims[0])
+    
+    c = canvas.Canvas(output_path, pagesize=page_dims)
+    page_width, page_height = page_dims
+    
+    def prepare(upload):
+        return prepare_image(upload, page_dims, target_dpi, jpeg_quality)
+    
+    count_pages(len(uploads))
+    threads = app.config['IMAGE_DECODE_THREADS']
+    with stage('images'), ThreadPoolExecutor(max_workers=threads) as decoders:
+        for source, img_width, img_height in bounded_map(decoders, prepare, uploads, threads * 2):
+            scale_x = (page_width - 40) / img_width
+            scale_y = (page_height - 40) / img_height
+            scale = min(scale_x, scale_y)
+            
+            new_width = img_width * scale
+            new_height = img_height * scale
+            
+            x = (page_width - new_width) / 2
+            y = (page_height - new_height) / 2
+            
+            c.drawImage(source, x, y, new_width, new_height)
+            c.showPage()
+    
+    with stage('write'):
         c.save()
+
+def prepare_image(upload, page_dims, target_dpi, jpeg_quality):
+    """Decode and scale one image for images_to_pdf.
+
+    Returns the source to hand to drawImage along with the image's original
+    pixel size, which fixes where it sits on the page.
+    """
+    try:
+        # Whatever the file is called, its first bytes say if it is a JPEG
+        with open(upload.path, 'rb') as f:
+            is_jpeg = f.read(len(JPEG_SIGNATURE)) == JPEG_SIGNATURE
+        # Opening only reads the header; pixels are decoded on first use
+        img = Image.open(upload.path)
+        img_width, img_height = img.size
+        
+        target = None
+        if target_dpi > 0:
+            page_width, page_height = page_dims
+            scale = min((page_width - 40) / img_width, (page_height - 40) / img_height)
+            target = (max(1, round(img_width * scale / 72 * target_dpi)),
+                      max(1, round(img_height * scale / 72 * target_dpi)))
+            if target[0] >= img_width or target[1] >= img_height:
+                target = None
+        
+        if target is None and is_jpeg and jpeg_passes_through(img):
+            if upload.path.lower().endswith(('.jpg', '.jpeg')):
+                # Given a .jpg path, reportlab copies the JPEG bytes straight
+                # into the PDF without decoding or re-encoding them
+                return upload.path, img_width, img_height
+            # An ImageReader still copies the bytes, but decodes them to
+            # name the image; do that here on the worker thread
+            source = rl_utils.ImageReader(upload.path)
+            source.getRGBData()
+            return source, img_width, img_height
+        
+        if target is not None and is_jpeg:
+            # Let the decoder skip detail we are about to throw away
+            img.draft('RGB', target)
+        
+        if img.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'RGBA':
+                background.paste(img, mask=img.split()[-1])
+            else:
+                background.paste(img)
+            img = background
+        elif img.mode != 'RGB' and not (is_jpeg and img.mode == 'L'):
+            # Greyscale JPEGs are re-encoded as greyscale
+            img = img.convert('RGB')
+        
+        if target is not None:
+            img = img.resize(target, Image.LANCZOS)
+        
+        if is_jpeg:
+            # Photos stay JPEG; PNG, GIF and BMP are kept lossless
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=jpeg_quality)
+            buffer.seek(0)
+            source = rl_utils.ImageReader(buffer)
+        else:
+            source = rl_utils.ImageReader(img)
         
-        return send_file_and_cleanup(output_path, output_filename)
+        # drawImage needs the pixel data to name the image; decode it here on
+        # the worker thread, where the result is cached on the reader
+        source.getRGBData()
+        return source, img_width, img_height
     
-    except Exception as e:
-        return jsonify({'error': f'JPG to PDF conversion failed: {str(e)}'}), 500
+    except Exception as img_error:
+        raise Exception(f'Error processing image {upload.filename}: {str(img_error)}')
+
+def jpeg_passes_through(img):
+    """Whether reportlab can copy the JPEG ``img`` into a PDF as it is."""
+    if getattr(img, 'bits', 8) != 8:
+        return False
+    if img.mode == 'CMYK':
+        # reportlab writes the inverted Decode that Adobe's CMYK JPEGs need
+        return 'adobe' in img.info
+    return img.mode in ('RGB', 'L')
+
+def bounded_map(executor, func, items, window):
+    """Like ``executor.map`` but with at most ``window`` results in flight."""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
 
 @app.route('/pdf-to-ppt', methods=['POST'])
 def pdf_to_ppt():
-    try:
-        files = request.files.getlist('files')
-        if not files:
-            return jsonify({'error': 'No PDF file provided'}), 400
-            
-        file = files[0]
-        
-        if not allowed_file(file.filename, 'pdf'):
-            return jsonify({'error': 'Invalid PDF file'}), 400
-        
-        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        file.save(temp_input.name)
-        temp_input.close()
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'pdf_to_ppt_{timestamp}.pptx'
-        output_path = tempfile.mktemp(suffix='.pptx')
-        
-        convert_pdf_to_pptx(temp_input.name, output_path)
-        
-        os.unlink(temp_input.name)
-        
-        return send_file_and_cleanup(output_path, output_filename)
-    
-    except Exception as e:
-        return jsonify({'error': f'PDF to PowerPoint conversion failed: {str(e)}'}), 500
+    return handle_tool_request('pdf-to-ppt')
+
+@tool('pdf-to-ppt', 'pdf_to_ppt', output_ext='.pptx',
+      error_label='PDF to PowerPoint conversion failed')
+def run_pdf_to_ppt(uploads, output_path, options):
+    convert_pdf_to_pptx(uploads[0].path, output_path, uploads[0].sha256)
 
-def convert_pdf_to_pptx(pdf_path, pptx_path):
+def convert_pdf_to_pptx(pdf_path, pptx_path, sha256=None):
     try:
-        from pptx import Presentation
-        
-        if not PYMUPDF_AVAILABLE:
+        if not pymupdf_available():
             raise Exception("PyMuPDF is required for PDF to PowerPoint conversion")
         
-        doc_pdf = fitz.open(pdf_path)
-        prs = Presentation()
+        prs = pptx.Presentation()
+        page_num = 0
         
-        for page_num in range(len(doc_pdf)):
-            try:
-                page = doc_pdf[page_num]
-                
-                slide_layout = prs.slide_layouts[1]
-                slide = prs.slides.add_slide(slide_layout)
-                
+        for blocks in iter_page_blocks(pdf_path, sha256):
+            # Every page gets a slide, left blank when its text could not be
+            # read, so slide N is always page N
+            slide_layout = prs.slide_layouts[1]
+            slide = prs.slides.add_slide(slide_layout)
+            
+            if blocks is not None:
                 title_placeholder = slide.shapes.title
                 content_placeholder = slide.placeholders[1]
                 
-                text_dict = page.get_text("dict")
-                
-                all_text = []
-                for block in text_dict["blocks"]:
-                    if "lines" in block:
-                        block_text = ""
-                        for line in block["lines"]:
-                            line_text = ""
-                            for span in line["spans"]:
-                                line_text += span["text"]
-                            if line_text.strip():
-                                block_text += line_text.strip() + " "
-                        
-                        if block_text.strip():
-                            all_text.append(block_text.strip())
-                
-                if all_text:
+                if blocks:
                     title_placeholder.text = f"Page {page_num + 1}"
-                    content_placeholder.text = "\n".join(all_text[:10])
+                    content_placeholder.text = "\n".join(block.text for block in blocks[:10])
                 else:
                     title_placeholder.text = f"Page {page_num + 1}"
                     content_placeholder.text = "No text content found on this page."
-                    
-            except Exception as page_error:
-                print(f"Error processing page {page_num}: {str(page_error)}")
-                continue
+            
+            page_num += 1
         
-        doc_pdf.close()
-        prs.save(pptx_path)
+        with stage('write'):
+            prs.save(pptx_path)
         
     except Exception as e:
         raise Exception(f"PDF to PowerPoint conversion error: {str(e)}")
 
-@app.route('/add-page-numbers', methods=['POST'])
-def add_page_numbers():
+@app.route('/pdf-to-word', methods=['POST'])
+def pdf_to_word():
+    return handle_tool_request('pdf-to-word')
+
+@tool('pdf-to-word', 'pdf_to_word', output_ext='.docx',
+      error_label='PDF to Word conversion failed')
+def run_pdf_to_word(uploads, output_path, options):
+    convert_pdf_to_docx(uploads[0].path, output_path, uploads[0].sha256)
+
+def convert_pdf_to_docx(pdf_path, docx_path, sha256=None):
+    """Write the text of ``pdf_path`` to ``docx_path``, a paragraph per block.
+
+    Each page starts on a new page of the document. Blocks set well above
+    the page's body text size become headings.
+    """
     try:
-        files = request.files.getlist('files')
-        if not files:
-            return jsonify({'error': 'No PDF file provided'}), 400
+        if not pymupdf_available():
+            raise Exception("PyMuPDF is required for PDF to Word conversion")
+        
+        document = docx.Document()
+        headings = [document.styles['Heading 1'], document.styles['Heading 2']]
+        # Document.add_paragraph searches the whole body for the section
+        # properties that end it, every time; keep hold of them instead
+        body = document.element.body
+        section = body.sectPr
+        
+        def add_paragraph():
+            element = body._new_p()
+            section.addprevious(element)
+            return docx.text.paragraph.Paragraph(element, document._body)
+        
+        for page_num, blocks in enumerate(iter_page_blocks(pdf_path, sha256)):
+            if page_num:
+                add_paragraph().add_run().add_break(docx.enum.text.WD_BREAK.PAGE)
+            if not blocks:
+                continue
             
-        file = files[0]
-        if not allowed_file(file.filename, 'pdf'):
-            return jsonify({'error': 'Invalid PDF file'}), 400
-        
-        position = request.form.get('position', 'bottom-right')
-        start_page = int(request.form.get('startPage', 1))
-        
-        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        file.save(temp_input.name)
-        temp_input.close()
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'numbered_pdf_{timestamp}.pdf'
-        output_path = tempfile.mktemp(suffix='.pdf')
+            body_size = body_text_size(blocks)
+            for block in blocks:
+                paragraph = add_paragraph()
+                if block.size >= body_size * 1.6:
+                    paragraph.style = headings[0]
+                    paragraph.add_run(block.text)
+                elif block.size >= body_size * 1.25:
+                    paragraph.style = headings[1]
+                    paragraph.add_run(block.text)
+                else:
+                    paragraph.add_run(block.text).bold = block.bold
         
-        add_page_numbers_to_pdf(temp_input.name, output_path, position, start_page)
-        os.unlink(temp_input.name)
+        with stage('write'):
+            document.save(docx_path)
         
-        return send_file_and_cleanup(output_path, output_filename)
-    
     except Exception as e:
-        return jsonify({'error': f'Add page numbers failed: {str(e)}'}), 500
+        raise Exception(f"PDF to Word conversion error: {str(e)}")
 
-def add_page_numbers_to_pdf(input_path, output_path, position, start_page):
-    reader = PyPDF2.PdfReader(input_path)
-    writer = PyPDF2.PdfWriter()
-    
-    for i, page in enumerate(reader.pages):
-        packet = io.BytesIO()
-        can = canvas.Canvas(packet, pagesize=letter)
-        
-        if position == 'top-left':
-            x, y = 50, 750
-        elif position == 'top-right':
-            x, y = 500, 750
-        elif position == 'bottom-left':
-            x, y = 50, 50
+def body_text_size(blocks):
+    """The font size most of the text in ``blocks`` is set in."""
+    sizes = {}
+    for block in blocks:
+        sizes[block.size] = sizes.get(block.size, 0) + len(block.text)
+    return max(sizes, key=sizes.get)
+
+# A block of text on a page: its lines joined by spaces, the largest font
+# size in it, and whether all of it is bold
+TextBlock = namedtuple('TextBlock', ['text', 'size', 'bold'])
+
+_extractions = OrderedDict()
+_extract_lock = threading.Lock()
+
+def iter_page_blocks(pdf_path, sha256=None):
+    """Yield the TextBlocks of each page of ``pdf_path``, in page order.
+
+    Pages are extracted across the worker pool in ranges of up to
+    EXTRACT_CHUNK_PAGES, with only a few ranges in flight, so memory stays
+    flat however long the document is. Pages already extracted from a file
+    with the same content (``sha256``, hashed here if not given) come from
+    the cache. A page that could not be read yields None.
+    """
+    if sha256 is None:
+        with open(pdf_path, 'rb') as f:
+            sha256 = hashlib.file_digest(f, 'sha256').hexdigest()
+    with fitz.open(pdf_path) as doc_pdf:
+        page_count = len(doc_pdf)
+    count_pages(page_count)
+    
+    with _extract_lock:
+        cached = {page_num: _extractions[sha256, page_num] for page_num in range(page_count)
+                  if (sha256, page_num) in _extractions}
+    increment_metric('pdf_master_extract_cache_hits_total', len(cached))
+    increment_metric('pdf_master_extract_cache_misses_total', page_count - len(cached))
+    
+    if pdf_pool_enabled():
+        chunk = min(app.config['EXTRACT_CHUNK_PAGES'],
+                    max(1, math.ceil(page_count / app.config['PDF_WORKERS'])))
+    else:
+        chunk = app.config['EXTRACT_CHUNK_PAGES']
+    ranges = []
+    for page_num in range(page_count):
+        if page_num in cached:
+            continue
+        if ranges and ranges[-1][2] == page_num and page_num - ranges[-1][1] < chunk:
+            ranges[-1] = (pdf_path, ranges[-1][1], page_num + 1)
         else:
-            x, y = 500, 50
-        
-        page_num = i + start_page
-        can.drawString(x, y, str(page_num))
-        can.save()
-        
-        packet.seek(0)
-        overlay = PyPDF2.PdfReader(packet)
-        page.merge_page(overlay.pages[0])
-        writer.add_page(page)
+            ranges.append((pdf_path, page_num, page_num + 1))
     
-    with open(output_path, 'wb') as output_file:
-        writer.write(output_file)
-
-@app.route('/add-watermark', methods=['POST'])
-def add_watermark():
+    extracted = imap_pdf_tasks(extract_page_blocks, ranges, window=2 * max(1, app.config['PDF_WORKERS']))
     try:
-        files = request.files.getlist('files')
-        if not files:
-            return jsonify({'error': 'No PDF file provided'}), 400
+        pending = deque()
+        for page_num in range(page_count):
+            if page_num in cached:
+                yield cached[page_num]
+                continue
+            if not pending:
+                pending.extend(next(extracted))
+            blocks = pending.popleft()
+            if blocks is not None:
+                with _extract_lock:
+                    _extractions[sha256, page_num] = blocks
+                    while len(_extractions) > app.config['EXTRACT_CACHE_PAGES']:
+                        _extractions.popitem(last=False)
+            yield blocks
+    finally:
+        extracted.close()
+
+def extract_page_blocks(pdf_path, start, stop):
+    """Return the TextBlocks of pages ``start`` to ``stop`` of ``pdf_path``.
+
+    Each page yields a list of blocks, or ``None`` if the page could not be
+    read.
+    """
+    pages = []
+    with stage('extract'), fitz.open(pdf_path) as doc_pdf:
+        for page_num in range(start, stop):
+            try:
+                text_dict = doc_pdf[page_num].get_text("dict")
+            except Exception as page_error:
+                print(f"Error processing page {page_num}: {str(page_error)}")
+                pages.append(None)
+                continue
             
-        file = files[0]
-        if not allowed_file(file.filename, 'pdf'):
-            return jsonify({'error': 'Invalid PDF file'}), 400
-        
-        watermark_text = request.form.get('watermarkText', 'WATERMARK')
-        opacity = float(request.form.get('opacity', 0.3))
-        
-        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        file.save(temp_input.name)
-        temp_input.close()
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'watermarked_pdf_{timestamp}.pdf'
-        output_path = tempfile.mktemp(suffix='.pdf')
-        
-        add_watermark_to_pdf(temp_input.name, output_path, watermark_text, opacity)
-        os.unlink(temp_input.name)
-        
-        return send_file_and_cleanup(output_path, output_filename)
+            blocks = []
+            for block in text_dict["blocks"]:
+                if "lines" in block:
+                    block_text = ""
+                    size = 0
+                    bold = True
+                    for line in block["lines"]:
+                        line_text = ""
+                        for span in line["spans"]:
+                            line_text += span["text"]
+                            if span["text"].strip():
+                                size = max(size, round(span["size"], 1))
+                                bold = bold and bool(span["flags"] & 16)
+                        if line_text.strip():
+                            block_text += line_text.strip() + " "
+                    
+                    if block_text.strip():
+                        blocks.append(TextBlock(block_text.strip(), size, bold))
+            
+            pages.append(blocks)
+    return pages
+
+@app.route('/pdf-to-jpg', methods=['POST'])
+def pdf_to_jpg():
+    return handle_tool_request('pdf-to-jpg')
+
+RASTER_FORMATS = {'jpg': 'jpg', 'jpeg': 'jpg', 'png': 'png'}
+RASTER_DPI_RANGE = (36, 600)
+# Pages that would render to more pixels than this are rendered at a lower DPI
+RASTER_MAX_PIXELS = 100_000_000
+
+@tool('pdf-to-jpg', 'pdf_to_jpg', output_ext='.zip', error_label='PDF to image conversion failed',
+      options={'dpi': 150, 'format': 'jpg', 'quality': 85, 'pages': ''}, streamed=True)
+def stream_pdf_to_jpg(uploads, options, fileobj):
+    image_format = RASTER_FORMATS.get(options['format'].lower())
+    if image_format is None:
+        raise ToolError(f"Invalid value for format: {options['format']}")
+    if not RASTER_DPI_RANGE[0] <= options['dpi'] <= RASTER_DPI_RANGE[1]:
+        raise ToolError(f'DPI must be between {RASTER_DPI_RANGE[0]} and {RASTER_DPI_RANGE[1]}')
+    if not 1 <= options['quality'] <= 100:
+        raise ToolError('Quality must be between 1 and 100')
+    selection = parse_page_selection(options['pages'])
+    yield from write_page_images(uploads[0].path, fileobj, options['dpi'], image_format,
+                                 options['quality'], selection)
+
+def write_page_images(pdf_path, fileobj, dpi, image_format, quality, selection=None):
+    """Render the selected pages of ``pdf_path`` and write them to ``fileobj`` as a ZIP.
+
+    Pages are rendered across the worker pool in page ranges of up to
+    RASTER_CHUNK_PAGES. Workers leave their images on disk, and each range
+    is added to the archive, in page order, as soon as it is done, so only
+    the images not yet written are ever kept, and never in memory. This is
+    a generator: it yields 0 once the document has been opened, then the
+    number of pages written after each range.
+    """
+    if not pymupdf_available():
+        raise Exception("PyMuPDF is required for PDF to image conversion")
     
-    except Exception as e:
-        return jsonify({'error': f'Add watermark failed: {str(e)}'}), 500
+    with fitz.open(pdf_path) as doc:
+        if doc.needs_pass:
+            raise ToolError('PDF is password protected; unlock it first')
+        page_count = len(doc)
+    page_numbers = sorted(select_pages(page_count, selection))
+    count_pages(len(page_numbers))
+    yield 0
+    
+    if pdf_pool_enabled():
+        chunk = min(app.config['RASTER_CHUNK_PAGES'],
+                    max(1, math.ceil(len(page_numbers) / app.config['PDF_WORKERS'])))
+    else:
+        chunk = app.config['RASTER_CHUNK_PAGES']
+    digits = max(3, len(str(page_count)))
+    workdir = tempfile.mkdtemp(dir=app.config['UPLOAD_DIR'])
+    try:
+        ranges = [(pdf_path, page_numbers[i:i + chunk], dpi, image_format, quality, workdir, digits)
+                  for i in range(0, len(page_numbers), chunk)]
+        # JPEG and PNG data is compressed already
+        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_STORED) as archive:
+            written = 0
+            for image_paths in imap_pdf_tasks(render_page_images, ranges):
+                with stage('zip'):
+                    for image_path in image_paths:
+                        archive.write(image_path, os.path.basename(image_path))
+                        os.unlink(image_path)
+                written += len(image_paths)
+                yield written
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
 
-def add_watermark_to_pdf(input_path, output_path, watermark_text, opacity):
-    reader = PyPDF2.PdfReader(input_path)
-    writer = PyPDF2.PdfWriter()
+def render_page_images(pdf_path, page_numbers, dpi, image_format, quality, workdir, digits):
+    """Render pages ``page_numbers`` of ``pdf_path`` into ``workdir``; return the image paths."""
+    paths = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in page_numbers:
+            page = doc[page_num]
+            page_dpi = dpi
+            pixels = page.rect.width * page.rect.height * (dpi / 72) ** 2
+            if pixels > RASTER_MAX_PIXELS:
+                page_dpi = int(dpi * math.sqrt(RASTER_MAX_PIXELS / pixels))
+            with stage('render'):
+                pixmap = page.get_pixmap(dpi=page_dpi)
+            path = os.path.join(workdir, f'page_{page_num + 1:0{digits}d}.{image_format}')
+            with stage('encode'):
+                if image_format == 'jpg':
+                    # Pillow's libjpeg is several times faster than PyMuPDF's
+                    Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples).save(
+                        path, 'JPEG', quality=quality)
+                else:
+                    pixmap.save(path, output='png')
+            paths.append(path)
+    return paths
+
+@app.route('/add-page-numbers', methods=['POST'])
+def add_page_numbers():
+    return handle_tool_request('add-page-numbers')
+
+@tool('add-page-numbers', 'numbered_pdf', error_label='Add page numbers failed',
+      options={'position': 'bottom-right', 'startPage': 1, 'pages': '', 'writeMode': 'incremental'})
+def run_add_page_numbers(uploads, output_path, options):
+    run_pdf_task(add_page_numbers_to_pdf, uploads[0].path, output_path,
+                 options['position'], options['startPage'], parse_page_selection(options['pages']),
+                 options['writeMode'])
+
+def add_page_numbers_to_pdf(input_path, output_path, position, start_page, selection=None,
+                            write_mode='incremental'):
+    pages = read_pdf_pages(input_path)
+    changed = number_pdf_pages(pages, position, start_page, selection)
+    save_stamped_pages(input_path, pages, changed, output_path, write_mode)
+
+def number_pdf_pages(pages, position, start_page, selection=None):
+    if position == 'top-left':
+        x, y = 50, 750
+    elif position == 'top-right':
+        x, y = 500, 750
+    elif position == 'bottom-left':
+        x, y = 50, 50
+    else:
+        x, y = 500, 50
     
-    for page in reader.pages:
-        packet = io.BytesIO()
-        can = canvas.Canvas(packet, pagesize=letter)
-        
+    # Pages keep their own number when only some of them are labelled
+    selected = select_pages(len(pages), selection)
+    
+    def overlay_for_page(batch, i, page):
+        if i not in selected:
+            return None
+        label = str(i + start_page)
+        return batch.add(mediabox_size(page), lambda can: can.drawString(x, y, label))
+    
+    return stamp_pdf_pages(pages, overlay_for_page)
+
+@app.route('/add-watermark', methods=['POST'])
+def add_watermark():
+    return handle_tool_request('add-watermark')
+
+# How the stamp is put on each page; see watermark_pdf_pages
+WATERMARK_MODES = ('xobject', 'merge')
+
+def check_watermark_mode(mode):
+    if mode not in WATERMARK_MODES:
+        raise ToolError(f'Invalid value for watermarkMode: {mode}')
+
+@tool('add-watermark', 'watermarked_pdf', error_label='Add watermark failed',
+      options={'watermarkText': 'WATERMARK', 'opacity': 0.3, 'watermarkMode': 'xobject', 'pages': '',
+               'writeMode': 'incremental'})
+def run_add_watermark(uploads, output_path, options):
+    check_watermark_mode(options['watermarkMode'])
+    run_pdf_task(add_watermark_to_pdf, uploads[0].path, output_path, options['watermarkText'],
+                 options['opacity'], options['watermarkMode'], parse_page_selection(options['pages']),
+                 options['writeMode'])
+
+def add_watermark_to_pdf(input_path, output_path, watermark_text, opacity, mode='xobject',
+                         selection=None, write_mode='incremental'):
+    pages = read_pdf_pages(input_path)
+    changed = watermark_pdf_pages(pages, watermark_text, opacity, mode, selection)
+    save_stamped_pages(input_path, pages, changed, output_path, write_mode)
+
+def watermark_pdf_pages(pages, watermark_text, opacity, mode='xobject', selection=None):
+    def draw(can):
         can.setFillAlpha(opacity)
         can.setFont("Helvetica-Bold", 50)
         
@@ -348,53 +2495,128 @@ def add_watermark_to_pdf(input_path, output_path, watermark_text, opacity):
         can.drawString(-text_width/2, 0, watermark_text)
         
         can.restoreState()
-        can.save()
-        
-        packet.seek(0)
-        overlay = PyPDF2.PdfReader(packet)
-        page.merge_page(overlay.pages[0])
-        writer.add_page(page)
     
-    with open(output_path, 'wb') as output_file:
-        writer.write(output_file)
+    selected = select_pages(len(pages), selection)
+    
+    if mode == 'merge':
+        # The stamp is identical on every page, so render it once per page size
+        def overlay_for_page(batch, i, page):
+            if i not in selected:
+                return None
+            size = mediabox_size(page)
+            return batch.add(size, draw, key=size)
+        
+        return stamp_pdf_pages(pages, overlay_for_page)
+    
+    # Render the stamp once on a letter page and let every page reference it
+    batch = OverlayBatch()
+    batch.add(letter, draw)
+    stamp = overlay_to_form_xobject(batch.render()[0])
+    changed = sorted(selected)
+    
+    with stage('stamp'):
+        for i in changed:
+            page = pages[i]
+            x0, y0 = float(page.mediabox.left), float(page.mediabox.bottom)
+            width, height = mediabox_size(page)
+            scale = min(width / letter[0], height / letter[1])
+            tx = x0 + (width - letter[0] * scale) / 2
+            ty = y0 + (height - letter[1] * scale) / 2
+            draw_form_xobject(page, stamp, (scale, 0, 0, scale, tx, ty))
+    return changed
+
+def overlay_to_form_xobject(overlay_page):
+    """Turn a rendered overlay page into a Form XObject and return its reference.
+
+    The overlay's content stream is converted in place, so every page that
+    draws the returned reference shares one copy of the stamp and its fonts
+    in the output file.
+    """
+    contents = overlay_page.raw_get(PyPDF2.generic.NameObject('/Contents'))
+    stream = contents.get_object()
+    stream[PyPDF2.generic.NameObject('/Type')] = PyPDF2.generic.NameObject('/XObject')
+    stream[PyPDF2.generic.NameObject('/Subtype')] = PyPDF2.generic.NameObject('/Form')
+    stream[PyPDF2.generic.NameObject('/BBox')] = PyPDF2.generic.ArrayObject(
+        PyPDF2.generic.FloatObject(v) for v in overlay_page.mediabox
+    )
+    stream[PyPDF2.generic.NameObject('/Resources')] = overlay_page.raw_get(
+        PyPDF2.generic.NameObject('/Resources')
+    )
+    return contents
+
+def draw_form_xobject(page, xobject, matrix):
+    """Draw ``xobject`` on top of ``page`` with the ``cm`` transform ``matrix``.
+
+    The page keeps its original content streams; they are wrapped in a
+    save/restore pair and followed by a small stream that paints the form.
+    """
+    NameObject = PyPDF2.generic.NameObject
+    
+    DictionaryObject = PyPDF2.generic.DictionaryObject
+    
+    resources = DictionaryObject(page['/Resources'] if '/Resources' in page else {})
+    xobjects = DictionaryObject(resources['/XObject'] if '/XObject' in resources else {})
+    
+    name = '/PMStamp'
+    suffix = 0
+    while name in xobjects:
+        suffix += 1
+        name = f'/PMStamp{suffix}'
+    
+    xobjects[NameObject(name)] = xobject
+    resources[NameObject('/XObject')] = xobjects
+    page[NameObject('/Resources')] = resources
+    
+    cm = ' '.join(f'{v:.6f}' for v in matrix)
+    prefix = _content_stream(b'q\n')
+    suffix_stream = _content_stream(f'Q\nq {cm} cm {name} Do Q\n'.encode('latin-1'))
+    
+    contents = page.raw_get(NameObject('/Contents')) if '/Contents' in page else None
+    if contents is None:
+        existing = []
+    elif isinstance(contents.get_object(), PyPDF2.generic.ArrayObject):
+        existing = list(contents.get_object())
+    else:
+        existing = [contents]
+    for stream in existing:
+        # A page stamped earlier in a pipeline holds its merged content inline
+        if not isinstance(stream, PyPDF2.generic.IndirectObject) and not hasattr(stream, 'indirect_reference'):
+            stream.indirect_reference = None
+    
+    page[NameObject('/Contents')] = PyPDF2.generic.ArrayObject([prefix] + existing + [suffix_stream])
+
+def _content_stream(data):
+    stream = PyPDF2.generic.DecodedStreamObject()
+    stream.set_data(data)
+    # Lets PdfWriter promote the stream to an indirect object when the page is cloned
+    stream.indirect_reference = None
+    return stream
 
 @app.route('/crop-pdf', methods=['POST'])
 def crop_pdf():
-    try:
-        files = request.files.getlist('files')
-        if not files:
-            return jsonify({'error': 'No PDF file provided'}), 400
-            
-        file = files[0]
-        if not allowed_file(file.filename, 'pdf'):
-            return jsonify({'error': 'Invalid PDF file'}), 400
-        
-        top = float(request.form.get('top', 0)) / 100
-        bottom = float(request.form.get('bottom', 0)) / 100
-        left = float(request.form.get('left', 0)) / 100
-        right = float(request.form.get('right', 0)) / 100
-        
-        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        file.save(temp_input.name)
-        temp_input.close()
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'cropped_pdf_{timestamp}.pdf'
-        output_path = tempfile.mktemp(suffix='.pdf')
-        
-        crop_pdf_pages(temp_input.name, output_path, top, bottom, left, right)
-        os.unlink(temp_input.name)
-        
-        return send_file_and_cleanup(output_path, output_filename)
-    
-    except Exception as e:
-        return jsonify({'error': f'Crop PDF failed: {str(e)}'}), 500
+    return handle_tool_request('crop-pdf')
 
-def crop_pdf_pages(input_path, output_path, top, bottom, left, right):
-    reader = PyPDF2.PdfReader(input_path)
-    writer = PyPDF2.PdfWriter()
-    
-    for page in reader.pages:
+@tool('crop-pdf', 'cropped_pdf', error_label='Crop PDF failed',
+      options={'top': 0.0, 'bottom': 0.0, 'left': 0.0, 'right': 0.0, 'pages': '',
+               'writeMode': 'incremental'})
+def run_crop_pdf(uploads, output_path, options):
+    top = options['top'] / 100
+    bottom = options['bottom'] / 100
+    left = options['left'] / 100
+    right = options['right'] / 100
+    run_pdf_task(crop_pdf_file, uploads[0].path, output_path, top, bottom, left, right,
+                 parse_page_selection(options['pages']), options['writeMode'])
+
+def crop_pdf_file(input_path, output_path, top, bottom, left, right, selection=None,
+                  write_mode='incremental'):
+    pages = read_pdf_pages(input_path)
+    changed = crop_pdf_pages(pages, top, bottom, left, right, selection)
+    save_stamped_pages(input_path, pages, changed, output_path, write_mode)
+
+def crop_pdf_pages(pages, top, bottom, left, right, selection=None):
+    changed = sorted(select_pages(len(pages), selection))
+    for i in changed:
+        page = pages[i]
         page_width = float(page.mediabox.width)
         page_height = float(page.mediabox.height)
         
@@ -405,160 +2627,514 @@ def crop_pdf_pages(input_path, output_path, top, bottom, left, right):
         
         page.cropbox.lower_left = (crop_left, crop_bottom)
         page.cropbox.upper_right = (crop_right, crop_top)
-        
-        writer.add_page(page)
-    
-    with open(output_path, 'wb') as output_file:
-        writer.write(output_file)
+    return changed
 
 @app.route('/unlock-pdf', methods=['POST'])
 def unlock_pdf():
-    try:
-        files = request.files.getlist('files')
-        if not files:
-            return jsonify({'error': 'No PDF file provided'}), 400
-            
-        file = files[0]
-        if not allowed_file(file.filename, 'pdf'):
-            return jsonify({'error': 'Invalid PDF file'}), 400
-        
-        password = request.form.get('password', '')
-        
-        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        file.save(temp_input.name)
-        temp_input.close()
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'unlocked_pdf_{timestamp}.pdf'
-        output_path = tempfile.mktemp(suffix='.pdf')
-        
-        unlock_pdf_file(temp_input.name, output_path, password)
-        os.unlink(temp_input.name)
-        
-        return send_file_and_cleanup(output_path, output_filename)
-    
-    except Exception as e:
-        return jsonify({'error': f'Unlock PDF failed: {str(e)}'}), 500
+    return handle_tool_request('unlock-pdf')
+
+@tool('unlock-pdf', 'unlocked_pdf', error_label='Unlock PDF failed', accepts_locked=True,
+      options={'password': ''})
+def run_unlock_pdf(uploads, output_path, options):
+    run_pdf_task(unlock_pdf_file, uploads[0].path, output_path, options['password'])
 
 def unlock_pdf_file(input_path, output_path, password):
+    if crypto_backend() == 'pymupdf':
+        decrypt_pdf_file(input_path, output_path, password)
+        return
+    
     reader = PyPDF2.PdfReader(input_path)
     
     if reader.is_encrypted:
         if not reader.decrypt(password):
             raise Exception('Invalid password')
     
-    writer = PyPDF2.PdfWriter()
-    for page in reader.pages:
-        writer.add_page(page)
-    
-    with open(output_path, 'wb') as output_file:
-        writer.write(output_file)
+    write_pdf_pages(reader.pages, output_path)
+    count_pages(len(reader.pages))
+
+def decrypt_pdf_file(input_path, output_path, password):
+    """Copy ``input_path`` to ``output_path`` without its encryption.
+
+    MuPDF decrypts each string and stream only as it writes it out, and
+    copies the rest of the file without rebuilding the pages.
+    """
+    with stage('read'):
+        doc = fitz.open(input_path)
+    try:
+        # Files with only an owner password open without one
+        if doc.needs_pass and not doc.authenticate(password):
+            raise Exception('Invalid password')
+        count_pages(doc.page_count)
+        with stage('decrypt'):
+            doc.save(output_path, encryption=fitz.PDF_ENCRYPT_NONE)
+    finally:
+        doc.close()
 
 @app.route('/protect-pdf', methods=['POST'])
 def protect_pdf():
-    try:
-        files = request.files.getlist('files')
-        if not files:
-            return jsonify({'error': 'No PDF file provided'}), 400
-            
-        file = files[0]
-        if not allowed_file(file.filename, 'pdf'):
-            return jsonify({'error': 'Invalid PDF file'}), 400
-        
-        password = request.form.get('password', '')
-        if not password:
-            return jsonify({'error': 'Password is required'}), 400
-        
-        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        file.save(temp_input.name)
-        temp_input.close()
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'protected_pdf_{timestamp}.pdf'
-        output_path = tempfile.mktemp(suffix='.pdf')
-        
-        protect_pdf_file(temp_input.name, output_path, password)
-        os.unlink(temp_input.name)
-        
-        return send_file_and_cleanup(output_path, output_filename)
+    return handle_tool_request('protect-pdf')
+
+@tool('protect-pdf', 'protected_pdf', error_label='Protect PDF failed',
+      options={'password': '', 'encryption': ''})
+def run_protect_pdf(uploads, output_path, options):
+    if not options['password']:
+        raise ToolError('Password is required')
+    run_pdf_task(protect_pdf_file, uploads[0].path, output_path, options['password'],
+                 resolve_encryption(options['encryption']))
+
+def protect_pdf_file(input_path, output_path, password, encryption='aes-256'):
+    if crypto_backend() == 'pymupdf':
+        count_pages(encrypt_pdf_file(input_path, output_path, password, encryption))
+    else:
+        write_pdf_pages(read_pdf_pages(input_path), output_path, password=password,
+                        encryption=encryption)
+
+@app.route('/sign-pdf', methods=['POST'])
+def sign_pdf():
+    return handle_tool_request('sign-pdf')
+
+# The signature carries the signing time, so its output is never cached
+@tool('sign-pdf', 'signed_pdf', error_label='Sign PDF failed', cacheable=False,
+      options={'signatureText': 'SIGNED', 'position': 'bottom-right', 'writeMode': 'incremental'})
+def run_sign_pdf(uploads, output_path, options):
+    run_pdf_task(sign_pdf_file, uploads[0].path, output_path,
+                 options['signatureText'], options['position'], options['writeMode'])
+
+def sign_pdf_file(input_path, output_path, signature_text, position, write_mode='incremental'):
+    pages = read_pdf_pages(input_path)
+    changed = sign_pdf_pages(pages, signature_text, position)
+    save_stamped_pages(input_path, pages, changed, output_path, write_mode)
+
+def sign_pdf_pages(pages, signature_text, position):
+    if position == 'bottom-left':
+        x, y = 50, 50
+    elif position == 'bottom-right':
+        x, y = 400, 50
+    elif position == 'top-left':
+        x, y = 50, 750
+    else:
+        x, y = 400, 750
     
-    except Exception as e:
-        return jsonify({'error': f'Protect PDF failed: {str(e)}'}), 500
+    signed_at = datetime.now().strftime('%Y-%m-%d %H:%M')
+    last_page = len(pages) - 1
+    
+    def draw(can):
+        can.setFont("Helvetica-Bold", 12)
+        can.drawString(x, y, f"Digitally Signed: {signature_text}")
+        can.drawString(x, y-15, f"Date: {signed_at}")
+    
+    def overlay_for_page(batch, i, page):
+        if i != last_page:
+            return None
+        return batch.add(mediabox_size(page), draw)
+    
+    return stamp_pdf_pages(pages, overlay_for_page)
 
-def protect_pdf_file(input_path, output_path, password):
-    reader = PyPDF2.PdfReader(input_path)
-    writer = PyPDF2.PdfWriter()
+@app.route('/compress-pdf', methods=['POST'])
+def compress_pdf():
+    return handle_tool_request('compress-pdf')
+
+# Resolution and JPEG quality that images are brought down to
+COMPRESSION_PRESETS = {
+    'screen': {'dpi': 72, 'quality': 50},
+    'ebook': {'dpi': 150, 'quality': 70},
+    'print': {'dpi': 300, 'quality': 85},
+}
+
+@tool('compress-pdf', 'compressed_pdf', error_label='Compress PDF failed',
+      options={'preset': 'ebook'})
+def run_compress_pdf(uploads, output_path, options):
+    preset = COMPRESSION_PRESETS.get(options['preset'])
+    if preset is None:
+        raise ToolError(f"Unknown compression preset: {options['preset']}")
+    run_pdf_task(compress_pdf_file, uploads[0].path, output_path,
+                 preset['dpi'], preset['quality'])
+
+def compress_pdf_file(input_path, output_path, dpi, quality):
+    if pymupdf_available():
+        doc = fitz.open(input_path)
+        try:
+            count_pages(len(doc))
+            with stage('images'):
+                downsample_pdf_images(doc, dpi, quality)
+            # garbage=4 also merges identical objects, so an image or font
+            # embedded separately on every page is stored once
+            with stage('write'):
+                doc.save(output_path, garbage=4, clean=True, deflate=True,
+                         deflate_images=True, deflate_fonts=True)
+        finally:
+            doc.close()
+    else:
+        writer = PyPDF2.PdfWriter()
+        for page in read_pdf_pages(input_path):
+            writer.add_page(page)
+        with stage('compress'):
+            for page in writer.pages:
+                page.compress_content_streams()
+        with stage('write'), open(output_path, 'wb') as output_file:
+            writer.write(output_file)
+    
+    # Never hand back a file bigger than the one we were given
+    if os.path.getsize(output_path) >= os.path.getsize(input_path):
+        shutil.copyfile(input_path, output_path)
+
+def downsample_pdf_images(doc, dpi, quality):
+    """Re-encode images drawn at more than ``dpi`` as JPEGs at ``dpi``.
+
+    Each image is measured at the largest size it is drawn on any page.
+    Images with a soft mask or fewer than 8 bits per component are left
+    alone, as is any image that would not get smaller.
+    """
+    drawn = {}
+    for page in doc:
+        for xref, smask, width, height, bpc, _, _, _, image_filter, _ in page.get_images(full=True):
+            if smask or bpc < 8:
+                continue
+            for rect in page.get_image_rects(xref):
+                _, widest, tallest, _, _ = drawn.get(xref, (page, 0, 0, 0, None))
+                drawn[xref] = (page, max(widest, rect.width), max(tallest, rect.height),
+                               width, image_filter)
+    
+    for xref, (page, drawn_width, drawn_height, width, image_filter) in drawn.items():
+        target = (round(drawn_width / 72 * dpi), round(drawn_height / 72 * dpi))
+        # Leave images alone unless they are well over the target resolution
+        if not target[0] or not target[1] or width < target[0] * 1.5:
+            continue
+        raw = doc.xref_stream_raw(xref)
+        try:
+            if image_filter == 'DCTDecode':
+                img = Image.open(io.BytesIO(raw))
+                img.draft('RGB', target)
+            else:
+                pixmap = fitz.Pixmap(doc, xref)
+                if pixmap.colorspace is None or pixmap.colorspace.n not in (1, 3):
+                    pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+                img = Image.frombytes('L' if pixmap.n == 1 else 'RGB',
+                                      (pixmap.width, pixmap.height), pixmap.samples)
+            if img.mode not in ('L', 'RGB'):
+                img = img.convert('RGB')
+            img = img.resize(target, Image.LANCZOS)
+            
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=quality, optimize=True)
+        except Exception:
+            # Anything we cannot decode is kept as it was
+            continue
+        if buffer.tell() < len(raw):
+            page.replace_image(xref, stream=buffer.getvalue())
+
+@app.route('/pipeline', methods=['POST'])
+def pipeline():
+    return handle_tool_request('pipeline')
+
+# Pipeline operations and the tool whose options each one takes
+PIPELINE_OPERATIONS = {
+    'crop': 'crop-pdf',
+    'number': 'add-page-numbers',
+    'watermark': 'add-watermark',
+    'sign': 'sign-pdf',
+    'encrypt': 'protect-pdf',
+}
+
+def parse_pipeline(operations):
+    """Turn the ``operations`` JSON into a list of ``(op, options)`` steps.
+
+    ``operations`` is a list like ``[{"op": "number", "position": "top-right"},
+    {"op": "encrypt", "password": "secret"}]``; each step's other fields are
+    read like the form fields of the matching single tool.
+    """
+    try:
+        operations = json.loads(operations)
+    except ValueError:
+        raise ToolError('Invalid operations: not valid JSON')
+    if not isinstance(operations, list) or not operations:
+        raise ToolError('Invalid operations: expected a non-empty list')
     
-    for page in reader.pages:
-        writer.add_page(page)
+    steps = []
+    for i, step in enumerate(operations):
+        op = step.get('op') if isinstance(step, dict) else None
+        if op not in PIPELINE_OPERATIONS:
+            raise ToolError(f'Unknown operation: {op}')
+        if op == 'encrypt':
+            if i != len(operations) - 1:
+                raise ToolError('encrypt must be the last operation')
+            if not step.get('password'):
+                raise ToolError('Password is required')
+        options = TOOLS[PIPELINE_OPERATIONS[op]].parse_options(step)
+        if op == 'encrypt':
+            options['encryption'] = resolve_encryption(options['encryption'])
+        if op == 'watermark':
+            check_watermark_mode(options['watermarkMode'])
+        if 'pages' in options:
+            options['selection'] = parse_page_selection(options['pages'])
+        steps.append((op, options))
+    return steps
+
+def pipeline_cacheable(options):
+    # A signature carries the signing time; see sign-pdf
+    try:
+        return all(op != 'sign' for op, _ in parse_pipeline(options['operations']))
+    except ToolError:
+        return False
+
+@tool('pipeline', 'processed_pdf', error_label='Pipeline failed',
+      options={'operations': ''}, cacheable=pipeline_cacheable)
+def run_pipeline(uploads, output_path, options):
+    steps = parse_pipeline(options['operations'])
+    run_pdf_task(pipeline_pdf_file, uploads[0].path, output_path, steps)
+
+def pipeline_pdf_file(input_path, output_path, steps):
+    """Apply ``steps`` in order to one set of pages and write them once."""
+    pages = read_pdf_pages(input_path)
+    password, encryption = None, 'aes-256'
     
-    writer.encrypt(password)
+    for op, options in steps:
+        if op == 'crop':
+            crop_pdf_pages(pages, options['top'] / 100, options['bottom'] / 100,
+                           options['left'] / 100, options['right'] / 100, options['selection'])
+        elif op == 'number':
+            number_pdf_pages(pages, options['position'], options['startPage'], options['selection'])
+        elif op == 'watermark':
+            watermark_pdf_pages(pages, options['watermarkText'], options['opacity'],
+                                options['watermarkMode'], options['selection'])
+        elif op == 'sign':
+            sign_pdf_pages(pages, options['signatureText'], options['position'])
+        elif op == 'encrypt':
+            password, encryption = options['password'], options['encryption']
     
-    with open(output_path, 'wb') as output_file:
-        writer.write(output_file)
+    write_pdf_pages(pages, output_path, password=password, encryption=encryption)
 
-@app.route('/sign-pdf', methods=['POST'])
-def sign_pdf():
+_job_queue = None
+_job_reaper = None
+_job_lock = threading.Lock()
+# Jobs queued or running in this process, which the reaper keeps touching
+_active_jobs = set()
+
+def get_job_queue():
+    global _job_queue
+    start_job_reaper()
+    with _job_lock:
+        if _job_queue is None:
+            _job_queue = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'],
+                                            thread_name_prefix='pdf-job')
+        return _job_queue
+
+def start_job_reaper():
+    global _job_reaper
+    with _job_lock:
+        if _job_reaper is None:
+            os.makedirs(app.config['JOBS_DIR'], exist_ok=True)
+            _job_reaper = threading.Thread(target=reap_jobs, name='pdf-job-reaper', daemon=True)
+            _job_reaper.start()
+
+def job_dir(job_id):
+    # Job ids come from URLs, so only accept the hex ids we hand out
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return None
+    return os.path.join(app.config['JOBS_DIR'], job_id)
+
+def read_job(job_id):
+    directory = job_dir(job_id)
+    if directory is None:
+        return None
     try:
-        files = request.files.getlist('files')
-        if not files:
-            return jsonify({'error': 'No PDF file provided'}), 400
-            
-        file = files[0]
-        if not allowed_file(file.filename, 'pdf'):
-            return jsonify({'error': 'Invalid PDF file'}), 400
-        
-        signature_text = request.form.get('signatureText', 'SIGNED')
-        position = request.form.get('position', 'bottom-right')
-        
-        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        file.save(temp_input.name)
-        temp_input.close()
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_filename = f'signed_pdf_{timestamp}.pdf'
-        output_path = tempfile.mktemp(suffix='.pdf')
-        
-        sign_pdf_file(temp_input.name, output_path, signature_text, position)
-        os.unlink(temp_input.name)
-        
-        return send_file_and_cleanup(output_path, output_filename)
+        with open(os.path.join(directory, 'job.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def update_job(job_id, **changes):
+    """Merge ``changes`` into the job's status file.
+
+    The status lives on disk rather than in memory so that any worker
+    process sharing JOBS_DIR can answer status and result requests.
+    """
+    directory = job_dir(job_id)
+    job = read_job(job_id) or {}
+    job.update(changes)
+    temp_path = os.path.join(directory, f'job.json.{threading.get_ident()}')
+    with open(temp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(temp_path, os.path.join(directory, 'job.json'))
+    return job
+
+def create_job_record(tool, result_ext, **fields):
+    """Create the directory and status file of a new job; return its id."""
+    start_job_reaper()
+    job_id = uuid.uuid4().hex
+    os.makedirs(job_dir(job_id))
+    update_job(job_id, id=job_id, tool=tool.name, result_ext=result_ext, progress=0,
+               created_at=time.time(), **fields)
+    return job_id
+
+def claim_job(job_id):
+    """Keep touching ``job_id`` from this process (see job_stale) until release_job."""
+    with _job_lock:
+        _active_jobs.add(job_id)
+
+def release_job(job_id):
+    with _job_lock:
+        _active_jobs.discard(job_id)
+
+def job_result_path(job_id):
+    return os.path.join(job_dir(job_id), 'result' + read_job(job_id)['result_ext'])
+
+def finish_job(job_id, tool, uploads, output_path, **fields):
+    input_size, output_size = result_sizes(uploads, output_path)
+    filename = tool.output_filename(os.path.splitext(output_path)[1])
+    return update_job(job_id, status='done', progress=100, finished_at=time.time(),
+                      filename=filename, input_size=input_size, output_size=output_size, **fields)
+
+def submit_job(tool, files, options, profile_id=None):
+    queue = get_job_queue()
+    job_id = create_job_record(tool, tool.result_ext(files), status='queued')
+    try:
+        uploads = save_uploads(files, job_dir(job_id))
+    except Exception:
+        shutil.rmtree(job_dir(job_id), ignore_errors=True)
+        raise
+    claim_job(job_id)
+    queue.submit(run_job, job_id, tool.name, uploads, options, profile_id)
+    increment_metric('pdf_master_jobs_queued')
+    return job_id
+
+def run_job(job_id, name, uploads, options, profile_id=None):
+    tool = TOOLS[name]
+    output_path = job_result_path(job_id)
+    increment_metric('pdf_master_jobs_queued', -1)
+    started_at = time.time()
+    job = update_job(job_id, status='running', progress=5, started_at=started_at)
+    observe_metric('pdf_master_queue_wait_seconds', started_at - job['created_at'], tool=name)
     
+    # Pool tasks report completed fractions; leave room for writing the output
+    _progress.callback = lambda fraction: update_job(job_id, progress=round(5 + 90 * fraction))
+    try:
+        # Jobs are queued already, so they wait for admission as long as it takes
+        with instrument(tool, profile_id) as stats, admitted(tool, uploads, wait=False):
+            if tool.is_bulk(uploads):
+                with open(output_path, 'wb') as archive_file:
+                    for done in write_bulk_zip(tool, uploads, options, archive_file, job_dir(job_id)):
+                        report_progress(done / len(uploads))
+            else:
+                run_tool(tool, uploads, options, output_path)
+        job = finish_job(job_id, tool, uploads, output_path, timings=stats.stages)
+    except ToolError as e:
+        job = update_job(job_id, status='failed', error=str(e), finished_at=time.time())
     except Exception as e:
-        return jsonify({'error': f'Sign PDF failed: {str(e)}'}), 500
+        job = update_job(job_id, status='failed', error=tool.error_message(e), finished_at=time.time())
+    finally:
+        _progress.callback = None
+        remove_uploads(uploads)
+        release_job(job_id)
+    increment_metric('pdf_master_jobs_total', tool=name, status=job['status'])
 
-def sign_pdf_file(input_path, output_path, signature_text, position):
-    reader = PyPDF2.PdfReader(input_path)
-    writer = PyPDF2.PdfWriter()
+def job_expired(job):
+    finished_at = job.get('finished_at')
+    return finished_at is not None and time.time() - finished_at > app.config['JOB_RESULT_TTL']
+
+def job_stale(job):
+    """Whether an unfinished job has lost the process that was running it.
+
+    Its process touches job.json every JOB_HEARTBEAT while the job is queued
+    or running, and a progress update rewrites it; a job left alone for
+    JOB_STALE_AFTER belongs to a worker that died or was restarted.
+    """
+    if job.get('finished_at') is not None:
+        return False
+    try:
+        touched = os.path.getmtime(os.path.join(job_dir(job['id']), 'job.json'))
+    except OSError:
+        return False
+    return time.time() - touched > app.config['JOB_STALE_AFTER']
+
+def touch_active_jobs():
+    with _job_lock:
+        job_ids = list(_active_jobs)
+    for job_id in job_ids:
+        try:
+            os.utime(os.path.join(job_dir(job_id), 'job.json'))
+        except OSError:
+            pass
+
+def reap_jobs():
+    last_reap = time.monotonic()
+    while True:
+        time.sleep(app.config['JOB_HEARTBEAT'])
+        touch_active_jobs()
+        if time.monotonic() - last_reap < min(60, app.config['JOB_RESULT_TTL']):
+            continue
+        last_reap = time.monotonic()
+        try:
+            job_ids = os.listdir(app.config['JOBS_DIR'])
+        except OSError:
+            continue
+        for job_id in job_ids:
+            job = read_job(job_id)
+            if job is None:
+                continue
+            if job_stale(job):
+                # Reaped like any other failed job once JOB_RESULT_TTL is up
+                update_job(job_id, status='failed', finished_at=time.time(),
+                           error='Job was lost when its server process stopped; please try again')
+                increment_metric('pdf_master_jobs_total', tool=job['tool'], status='failed')
+            elif job_expired(job):
+                shutil.rmtree(job_dir(job_id), ignore_errors=True)
+
+def job_status(job):
+    status = {key: job.get(key) for key in ('id', 'tool', 'status', 'progress')}
+    if job.get('error'):
+        status['error'] = job['error']
+    if job['status'] == 'done':
+        status['result_url'] = f"/jobs/{job['id']}/result"
+        status['input_size'] = job.get('input_size')
+        status['output_size'] = job.get('output_size')
+        status['timings'] = job.get('timings')
+    return status
+
+@app.route('/jobs/<name>', methods=['POST'])
+def create_job(name):
+    tool = TOOLS.get(name)
+    if tool is None:
+        return jsonify({'error': f'Unknown tool: {name}'}), 404
     
-    for i, page in enumerate(reader.pages):
-        if i == len(reader.pages) - 1:
-            packet = io.BytesIO()
-            can = canvas.Canvas(packet, pagesize=letter)
-            
-            if position == 'bottom-left':
-                x, y = 50, 50
-            elif position == 'bottom-right':
-                x, y = 400, 50
-            elif position == 'top-left':
-                x, y = 50, 750
-            else:
-                x, y = 400, 750
-            
-            can.setFont("Helvetica-Bold", 12)
-            can.drawString(x, y, f"Digitally Signed: {signature_text}")
-            can.drawString(x, y-15, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-            can.save()
-            
-            packet.seek(0)
-            overlay = PyPDF2.PdfReader(packet)
-            page.merge_page(overlay.pages[0])
-        
-        writer.add_page(page)
+    profile_id = new_profile_id()
+    try:
+        files = tool.select_files(request.files.getlist('files'))
+        job_id = submit_job(tool, files, tool.parse_options(request.form), profile_id)
+    except ToolError as e:
+        return jsonify({'error': str(e)}), 400
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({'error': tool.error_message(e)}), 500
+    
+    response = jsonify(job_status(read_job(job_id)))
+    if profile_id:
+        # Available once the job has finished
+        response.headers['X-Profile-Url'] = f'/profiles/{profile_id}'
+    return response, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    # Lets a restarted process fail the jobs its predecessor lost
+    start_job_reaper()
+    job = read_job(job_id)
+    if job is None or job_expired(job):
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_status(job))
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = read_job(job_id)
+    if job is None or job_expired(job):
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': 'Job has not finished', 'status': job['status']}), 409
     
-    with open(output_path, 'wb') as output_file:
-        writer.write(output_file)
+    return send_result(job_result_path(job_id), job['filename'])
 
 if __name__ == '__main__':
+    if os.environ.get('WARM_UP_BACKENDS', '0') == '1':
+        warm_up()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
\ No newline at end of file
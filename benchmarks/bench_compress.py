@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Track /compress-pdf size reduction and time for each preset"""
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_image_pdf, make_photo_set, make_text_pdf
+
+import app
+import PyPDF2
+
+
+def make_corpus(workdir, scale):
+    """Build the documents each preset is run against.
+
+    photos:    phone photos, one per page, at full camera resolution
+    duplicated: one image page merged in many times, each copy stored separately
+    text:      plain text pages with nothing to downsample
+    """
+    photos = make_photo_set(workdir, scale)
+    uploads = [app.Upload(path, os.path.basename(path), None) for path in photos]
+    app.images_to_pdf(uploads, os.path.join(workdir, 'photos.pdf'), 'A4', 'portrait')
+
+    page = make_image_pdf(os.path.join(workdir, 'page.pdf'), 1)
+    merger = PyPDF2.PdfMerger()
+    for _ in range(scale * 4):
+        merger.append(page)
+    merger.write(os.path.join(workdir, 'duplicated.pdf'))
+    merger.close()
+
+    make_text_pdf(os.path.join(workdir, 'text.pdf'), scale * 20)
+    return ['photos', 'duplicated', 'text']
+
+
+def bench_compress(scale=10):
+    print(f"Compression benchmark (scale {scale}, PyMuPDF {'on' if app.pymupdf_available() else 'off'})")
+    print(f"{'document':>10} {'preset':>7} {'input MB':>9} {'output MB':>10} {'ratio':>6} {'seconds':>8}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in make_corpus(workdir, scale):
+            input_path = os.path.join(workdir, f'{name}.pdf')
+            input_size = os.path.getsize(input_path)
+            for preset_name, preset in app.COMPRESSION_PRESETS.items():
+                output_path = os.path.join(workdir, f'{name}_{preset_name}_out.pdf')
+                start = time.perf_counter()
+                app.compress_pdf_file(input_path, output_path, preset['dpi'], preset['quality'])
+                elapsed = time.perf_counter() - start
+                output_size = os.path.getsize(output_path)
+                print(f"{name:>10} {preset_name:>7} {input_size / 1e6:>9.2f} {output_size / 1e6:>10.2f} "
+                      f"{output_size / input_size:>6.2f} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    bench_compress(scale)
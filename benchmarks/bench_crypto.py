@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""MB/sec of /protect-pdf and /unlock-pdf for each crypto backend and method
+
+    python bench_crypto.py [image pages]
+
+Runs on an image-heavy document, where nearly every byte is in a stream
+that has to be encrypted or decrypted.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_image_pdf
+
+import app
+
+PASSWORD = 'secret'
+
+# backend: encryption methods it can write
+BACKENDS = {
+    'pymupdf': ('aes-256', 'aes-128', 'rc4-128'),
+    'pypdf2': ('rc4-128',),
+}
+
+
+def _best(func, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_crypto(pages=20, runs=3):
+    app.app.config['PDF_WORKERS'] = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        source = make_image_pdf(os.path.join(workdir, 'input.pdf'), pages)
+        size = os.path.getsize(source) / 1e6
+        print(f"Protect/unlock benchmark ({pages} image pages, {size:.1f} MB; best of {runs})")
+        print(f"{'backend':>8} {'method':>8} {'protect MB/s':>13} {'unlock MB/s':>12}")
+
+        for backend, methods in BACKENDS.items():
+            if backend == 'pymupdf' and not app.pymupdf_available():
+                continue
+            app.app.config['PDF_CRYPTO'] = backend
+            for method in methods:
+                locked = os.path.join(workdir, f'{backend}-{method}.pdf')
+                unlocked = os.path.join(workdir, 'unlocked.pdf')
+                protect = _best(lambda: app.protect_pdf_file(source, locked, PASSWORD, method), runs)
+                unlock = _best(lambda: app.unlock_pdf_file(locked, unlocked, PASSWORD), runs)
+                print(f"{backend:>8} {method:>8} {size / protect:>13.1f} {size / unlock:>12.1f}")
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    bench_crypto(pages)
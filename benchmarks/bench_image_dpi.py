@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""Time /jpg-to-pdf downsampling at each target DPI and decode thread count"""
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_photo_set
+
+import app
+
+TARGET_DPIS = [0, 300, 150, 96]
+THREAD_COUNTS = [1, 2, 4, 8]
+
+
+def bench_image_dpi(count=50, size=(4032, 3024)):
+    print(f"Image downsampling benchmark ({count} photos, {size[0]}x{size[1]}, {os.cpu_count()} CPUs)")
+    print(f"{'dpi':>5} {'threads':>8} {'seconds':>8} {'output MB':>10}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        photos = make_photo_set(workdir, count, size)
+        uploads = [app.Upload(path, os.path.basename(path), None) for path in photos]
+        output = os.path.join(workdir, 'out.pdf')
+        for dpi in TARGET_DPIS:
+            for threads in THREAD_COUNTS:
+                app.app.config['IMAGE_DECODE_THREADS'] = threads
+                start = time.perf_counter()
+                app.images_to_pdf(uploads, output, 'A4', 'portrait', dpi)
+                elapsed = time.perf_counter() - start
+                print(f"{dpi or 'orig':>5} {threads:>8} {elapsed:>8.2f} {os.path.getsize(output) / 1e6:>10.1f}")
+                if not dpi:
+                    # Passthrough does no decoding, so threads make no difference
+                    break
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    bench_image_dpi(count)
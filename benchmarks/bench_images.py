@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Compare the in-memory image pipeline with the previous temp-file pipeline"""
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_photo_set
+
+import app
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+
+def legacy_images_to_pdf(uploads, output_path):
+    """The pipeline images_to_pdf replaced: copy, decode and re-encode every image."""
+    c = canvas.Canvas(output_path, pagesize=A4)
+    page_width, page_height = A4
+    for upload in uploads:
+        temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
+        with open(upload.path, 'rb') as f:
+            temp_input.write(f.read())
+        temp_input.close()
+
+        img = Image.open(temp_input.name)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        scale = min((page_width - 40) / img.size[0], (page_height - 40) / img.size[1])
+        new_width, new_height = img.size[0] * scale, img.size[1] * scale
+
+        temp_output = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
+        img.save(temp_output.name, 'JPEG', quality=95)
+        temp_output.close()
+
+        c.drawImage(temp_output.name, (page_width - new_width) / 2, (page_height - new_height) / 2,
+                    new_width, new_height)
+        c.showPage()
+        os.unlink(temp_input.name)
+        os.unlink(temp_output.name)
+    c.save()
+
+
+def io_counters():
+    """Return this process's I/O counters from /proc (Linux only)."""
+    with open('/proc/self/io') as f:
+        return {key: int(value) for key, value in (line.split(': ') for line in f)}
+
+
+def measure(convert, uploads, output_path):
+    before = io_counters()
+    start = time.perf_counter()
+    convert(uploads, output_path)
+    elapsed = time.perf_counter() - start
+    after = io_counters()
+    return elapsed, {key: after[key] - before[key] for key in after}
+
+
+def bench_images(count=200, size=(4032, 3024)):
+    print(f"Image to PDF benchmark ({count} photos, {size[0]}x{size[1]})")
+    print(f"{'pipeline':>10} {'seconds':>8} {'syscalls':>9} {'read MB':>8} {'written MB':>11} {'output MB':>10}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        photos = make_photo_set(workdir, count, size)
+        uploads = [app.Upload(path, os.path.basename(path), None) for path in photos]
+        pipelines = [
+            ('temp-file', legacy_images_to_pdf),
+            ('in-memory', lambda u, out: app.images_to_pdf(u, out, 'A4', 'portrait')),
+        ]
+        for label, convert in pipelines:
+            output = os.path.join(workdir, f'{label}.pdf')
+            elapsed, io = measure(convert, uploads, output)
+            print(f"{label:>10} {elapsed:>8.2f} {io['syscr'] + io['syscw']:>9} "
+                  f"{io['rchar'] / 1e6:>8.1f} {io['wchar'] / 1e6:>11.1f} {os.path.getsize(output) / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bench_images(count)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Measure peak RSS of merge_pdf_files against total input size"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_image_pdf
+
+import app
+
+
+def _merge_in_child(engine, input_paths, output_path, results):
+    if engine != 'pymupdf':
+        app.pymupdf_available = lambda: False
+    start = time.perf_counter()
+    app.merge_pdf_files(input_paths, output_path)
+    elapsed = time.perf_counter() - start
+    results.put((elapsed, app.peak_rss()))
+
+
+def measure(engine, input_paths, output_path):
+    results = multiprocessing.get_context('spawn').Queue()
+    proc = multiprocessing.get_context('spawn').Process(
+        target=_merge_in_child, args=(engine, input_paths, output_path, results))
+    proc.start()
+    elapsed, peak_rss = results.get()
+    proc.join()
+    return elapsed, peak_rss
+
+
+def bench_merge(file_counts=(5, 10, 20), pages_per_file=10):
+    print("Merge benchmark (peak RSS vs total input size)")
+    print(f"{'files':>6} {'input MB':>9} {'engine':>8} {'seconds':>8} {'peak RSS MB':>12}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = make_image_pdf(os.path.join(workdir, 'scan.pdf'), pages_per_file)
+        for count in file_counts:
+            input_paths = [source] * count
+            total_mb = os.path.getsize(source) * count / 1e6
+            for engine in ('pymupdf', 'pypdf2'):
+                output = os.path.join(workdir, f'merged_{engine}_{count}.pdf')
+                elapsed, peak_rss = measure(engine, input_paths, output)
+                print(f"{count:>6} {total_mb:>9.1f} {engine:>8} {elapsed:>8.2f} {peak_rss / 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    counts = tuple(int(n) for n in sys.argv[1:]) or (5, 10, 20)
+    bench_merge(counts)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Compare /pipeline with the same tools chained as separate requests"""
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_text_pdf
+
+import app
+
+CHAIN = [
+    ('/add-page-numbers', {'position': 'bottom-right'}),
+    ('/add-watermark', {'watermarkText': 'CONFIDENTIAL', 'opacity': '0.3'}),
+    ('/protect-pdf', {'password': 'secret'}),
+]
+
+OPERATIONS = [
+    {'op': 'number', 'position': 'bottom-right'},
+    {'op': 'watermark', 'watermarkText': 'CONFIDENTIAL', 'opacity': 0.3},
+    {'op': 'encrypt', 'password': 'secret'},
+]
+
+
+def post(client, url, payload, form):
+    response = client.post(url, data={'files': (io.BytesIO(payload), 'input.pdf'), **form})
+    assert response.status_code == 200, response.data[:200]
+    return response.data
+
+
+def run_chain(client, payload):
+    uploaded = 0
+    for url, form in CHAIN:
+        uploaded += len(payload)
+        payload = post(client, url, payload, form)
+    return payload, uploaded
+
+
+def run_pipeline(client, payload):
+    return post(client, '/pipeline', payload, {'operations': json.dumps(OPERATIONS)}), len(payload)
+
+
+def bench_pipeline(page_counts=(10, 100, 500), runs=3):
+    print(f"Pipeline benchmark (number, watermark, encrypt; best of {runs})")
+    print(f"{'pages':>6} {'mode':>9} {'seconds':>8} {'uploaded MB':>12} {'output MB':>10}")
+
+    app.app.config['RESULT_CACHE_BYTES'] = 0
+    client = app.app.test_client()
+    with tempfile.TemporaryDirectory() as workdir:
+        app.app.config['JOBS_DIR'] = os.path.join(workdir, 'jobs')
+        for pages in page_counts:
+            with open(make_text_pdf(os.path.join(workdir, f'{pages}.pdf'), pages), 'rb') as f:
+                payload = f.read()
+            for mode, run in (('chain', run_chain), ('pipeline', run_pipeline)):
+                best = None
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    output, uploaded = run(client, payload)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                print(f"{pages:>6} {mode:>9} {best:>8.2f} {uploaded / 1e6:>12.2f} {len(output) / 1e6:>10.2f}")
+
+    app.shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    counts = [int(arg) for arg in sys.argv[1:]] or [10, 100, 500]
+    bench_pipeline(counts)
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Throughput of concurrent /add-watermark requests at different pool sizes"""
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from corpus import make_text_pdf
+
+import app
+
+
+def _post(payload):
+    client = app.app.test_client()
+    response = client.post('/add-watermark', data={
+        'files': (io.BytesIO(payload), 'input.pdf'),
+        'watermarkMode': 'merge',
+    })
+    assert response.status_code == 200, response.data[:200]
+
+
+def bench_pool(worker_counts=(1, 4, 8), requests=16, pages=60):
+    print(f"Process pool benchmark ({requests} concurrent requests, {pages} pages each, "
+          f"{os.cpu_count()} CPUs)")
+    print(f"{'workers':>8} {'seconds':>8} {'req/s':>8}")
+    # Every request posts the same file; with the result cache on, all but
+    # the first would be answered without touching the pool
+    app.app.config['RESULT_CACHE_BYTES'] = 0
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(make_text_pdf(os.path.join(workdir, 'input.pdf'), pages), 'rb') as f:
+            payload = f.read()
+
+        for workers in (0,) + tuple(worker_counts):
+            app.shutdown_pdf_pool()
+            app.app.config['PDF_WORKERS'] = workers
+            # Start the workers before timing so spawn cost is excluded
+            if workers:
+                list(ThreadPoolExecutor(workers).map(_post, [payload] * workers))
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=requests) as clients:
+                list(clients.map(_post, [payload] * requests))
+            elapsed = time.perf_counter() - start
+            label = workers if workers else 'inline'
+            print(f"{label:>8} {elapsed:>8.2f} {requests / elapsed:>8.2f}")
+
+    app.shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    counts = tuple(int(n) for n in sys.argv[1:]) or (1, 4, 8)
+    bench_pool(counts)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Speedup of page-sharded PDF to PowerPoint conversion against page count"""
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_text_pdf
+
+import app
+
+
+def _convert(source, output, workers):
+    app.shutdown_pdf_pool()
+    app.app.config['PDF_WORKERS'] = workers
+    # The serial run would otherwise leave every page extracted for the sharded one
+    app.app.config['EXTRACT_CACHE_PAGES'] = 0
+    if workers:
+        # Start the workers before timing so spawn cost is excluded
+        app.map_pdf_tasks(os.getpid, [()] * workers)
+    start = time.perf_counter()
+    app.convert_pdf_to_pptx(source, output)
+    return time.perf_counter() - start
+
+
+def bench_ppt(page_counts=(50, 200, 500), workers=None):
+    workers = workers or os.cpu_count() or 1
+    print(f"PDF to PowerPoint benchmark (serial vs {workers} workers)")
+    print(f"{'pages':>6} {'serial s':>9} {'sharded s':>10} {'speedup':>8}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for pages in page_counts:
+            source = make_text_pdf(os.path.join(workdir, f'text_{pages}.pdf'), pages)
+            serial = _convert(source, os.path.join(workdir, 'serial.pptx'), 0)
+            sharded = _convert(source, os.path.join(workdir, 'sharded.pptx'), workers)
+            print(f"{pages:>6} {serial:>9.2f} {sharded:>10.2f} {serial / sharded:>8.2f}")
+
+    app.shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    counts = tuple(int(n) for n in sys.argv[1:]) or (50, 200, 500)
+    bench_ppt(counts)
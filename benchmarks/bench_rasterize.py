@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Pages/sec of PDF to image rendering at 72, 150 and 300 DPI against pool size
+
+    python bench_rasterize.py [pages] [jpg|png]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_text_pdf
+
+import app
+
+DPIS = (72, 150, 300)
+
+
+class NullFile:
+    """Counts what the ZIP writer sends instead of keeping it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def _render(source, workers, dpi, image_format):
+    app.shutdown_pdf_pool()
+    app.app.config['PDF_WORKERS'] = workers
+    if workers:
+        # Start the workers before timing so spawn cost is excluded
+        app.map_pdf_tasks(os.getpid, [()] * workers)
+    sink = NullFile()
+    start = time.perf_counter()
+    for _ in app.write_page_images(source, sink, dpi, image_format, 85):
+        pass
+    return time.perf_counter() - start, sink.size
+
+
+def bench_rasterize(pages=60, image_format='jpg', worker_counts=None):
+    cpus = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({1, 2, 4, cpus})
+    print(f"PDF to {image_format.upper()} benchmark ({pages} pages, {cpus} CPUs; pages/sec)")
+    print(f"{'workers':>8}" + ''.join(f"{f'{dpi} DPI':>10}" for dpi in DPIS) + f" {'MB at ' + str(DPIS[-1]):>10}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app.app.config['UPLOAD_DIR'] = workdir
+        source = make_text_pdf(os.path.join(workdir, 'input.pdf'), pages)
+        for workers in (0,) + tuple(worker_counts):
+            line = f"{workers if workers else 'inline':>8}"
+            for dpi in DPIS:
+                elapsed, size = _render(source, workers, dpi, image_format)
+                line += f"{pages / elapsed:>10.1f}"
+            print(line + f" {size / 1e6:>10.1f}")
+
+    app.shutdown_pdf_pool()
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    image_format = sys.argv[2] if len(sys.argv) > 2 else 'jpg'
+    bench_rasterize(pages, image_format)
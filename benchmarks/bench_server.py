@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Requests per second from gunicorn compared with the Flask dev server
+
+Starts each server on a local port, fires concurrent /add-page-numbers
+requests at it over HTTP and reports throughput and latency.
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from corpus import make_text_pdf
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    'dev': [sys.executable, 'app.py'],
+    'gunicorn-gthread': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+    'gunicorn-sync': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                      '--worker-class', 'sync', 'app:app'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+def multipart(payload):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="input.pdf"\r\n'
+            f'Content-Type: application/pdf\r\n\r\n').encode() + payload + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def post(url, body, content_type):
+    start = time.perf_counter()
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    with urllib.request.urlopen(req, timeout=600) as response:
+        response.read()
+        assert response.status == 200
+    return time.perf_counter() - start
+
+
+def bench_server(requests=200, concurrency=16, pages=5):
+    print(f"Server benchmark ({requests} requests, {concurrency} concurrent, "
+          f"{pages}-page PDFs, {os.cpu_count()} CPUs)")
+    print(f"{'server':>17} {'seconds':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(make_text_pdf(os.path.join(workdir, 'input.pdf'), pages), 'rb') as f:
+            body, content_type = multipart(f.read())
+
+        for label, command in SERVERS.items():
+            port = free_port()
+            # Every request must do the work, so keep the result cache out of it
+            env = dict(os.environ, PORT=str(port), RESULT_CACHE_MB='0',
+                       JOBS_DIR=os.path.join(workdir, f'jobs-{label}'))
+            server = subprocess.Popen(command, cwd=REPO, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_for(port)
+                url = f'http://127.0.0.1:{port}/add-page-numbers'
+                # Warm up workers and their PDF pools before timing
+                with ThreadPoolExecutor(max_workers=concurrency) as clients:
+                    list(clients.map(lambda _: post(url, body, content_type), range(concurrency)))
+
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as clients:
+                    latencies = sorted(clients.map(lambda _: post(url, body, content_type), range(requests)))
+                elapsed = time.perf_counter() - start
+                print(f"{label:>17} {elapsed:>8.2f} {requests / elapsed:>8.1f} "
+                      f"{latencies[len(latencies) // 2] * 1000:>8.0f} "
+                      f"{latencies[int(len(latencies) * 0.95)] * 1000:>8.0f}")
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bench_server(requests)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Time from process start to the first response from / and from a tool
+
+Backends are imported lazily by default; WARM_UP_BACKENDS=1 imports them
+all before the server starts listening.
+"""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from bench_server import REPO, free_port, multipart, post
+from corpus import make_text_pdf
+
+MODES = {
+    'lazy': {'WARM_UP_BACKENDS': '0'},
+    'warm': {'WARM_UP_BACKENDS': '1'},
+}
+
+
+def first_response(url, started, timeout=60):
+    """Poll ``url`` until it answers; return the seconds since ``started``."""
+    deadline = started + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                response.read()
+                return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.01)
+    raise RuntimeError(f'No response from {url} within {timeout}s')
+
+
+def bench_startup(runs=5):
+    print(f"Startup benchmark (median of {runs} runs)")
+    print(f"{'mode':>6} {'first / ms':>11} {'first tool ms':>14}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(make_text_pdf(os.path.join(workdir, 'input.pdf'), 3), 'rb') as f:
+            body, content_type = multipart(f.read())
+
+        for mode, mode_env in MODES.items():
+            index_times, tool_times = [], []
+            for _ in range(runs):
+                port = free_port()
+                env = dict(os.environ, PORT=str(port), RESULT_CACHE_MB='0', PDF_WORKERS='0',
+                           JOBS_DIR=os.path.join(workdir, 'jobs'), **mode_env)
+                started = time.perf_counter()
+                server = subprocess.Popen([sys.executable, 'app.py'], cwd=REPO, env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                try:
+                    index_times.append(first_response(f'http://127.0.0.1:{port}/', started))
+                    post(f'http://127.0.0.1:{port}/add-page-numbers', body, content_type)
+                    tool_times.append(time.perf_counter() - started)
+                finally:
+                    server.send_signal(signal.SIGTERM)
+                    server.wait(timeout=30)
+            index_times.sort()
+            tool_times.sort()
+            print(f"{mode:>6} {index_times[runs // 2] * 1000:>11.0f} {tool_times[runs // 2] * 1000:>14.0f}")
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    bench_startup(runs)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""Compare the merge and shared-XObject watermark modes"""
+import os
+import sys
+import tempfile
+import time
+
+from corpus import make_text_pdf
+
+import app
+
+
+def bench_watermark(page_counts=(50, 200, 1000)):
+    print("Watermark benchmark (merge vs xobject)")
+    print(f"{'pages':>6} {'mode':>8} {'pages/s':>10} {'output bytes':>14}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for pages in page_counts:
+            source = make_text_pdf(os.path.join(workdir, f'text_{pages}.pdf'), pages)
+            for mode in ('merge', 'xobject'):
+                output = os.path.join(workdir, f'out_{mode}_{pages}.pdf')
+                start = time.perf_counter()
+                app.add_watermark_to_pdf(source, output, 'CONFIDENTIAL', 0.3, mode)
+                elapsed = time.perf_counter() - start
+                print(f"{pages:>6} {mode:>8} {pages / elapsed:>10.1f} {os.path.getsize(output):>14,}")
+
+
+if __name__ == "__main__":
+    counts = tuple(int(n) for n in sys.argv[1:]) or (50, 200, 1000)
+    bench_watermark(counts)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Pages/sec and peak memory of PDF to Word and PowerPoint conversion
+
+    python bench_word.py [page counts...]
+
+Each case runs in a fresh process so its peak RSS is its own; work runs on
+that process's own thread, as the PDF pool only starts from the main
+process. "both" converts to Word and then to PowerPoint, which reuses the
+pages extracted for Word.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from corpus import make_text_pdf
+
+import app
+
+CASES = {
+    'word': ['convert_pdf_to_docx'],
+    'ppt': ['convert_pdf_to_pptx'],
+    'both': ['convert_pdf_to_docx', 'convert_pdf_to_pptx'],
+}
+
+
+def run_case(case, source, workdir):
+    baseline = app.peak_rss()
+    app.warm_up()
+    start = time.perf_counter()
+    for name in CASES[case]:
+        ext = '.docx' if name == 'convert_pdf_to_docx' else '.pptx'
+        getattr(app, name)(source, os.path.join(workdir, 'output' + ext))
+    return time.perf_counter() - start, app.peak_rss(), baseline
+
+
+def bench_word(page_counts=(100, 500, 1000)):
+    print("PDF to Word/PowerPoint benchmark (one fresh process per case)")
+    print(f"{'pages':>6} {'case':>5} {'seconds':>8} {'pages/s':>8} {'peak MB':>8} {'growth MB':>10}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, max_tasks_per_child=1) as runner:
+            for pages in page_counts:
+                source = make_text_pdf(os.path.join(workdir, f'text_{pages}.pdf'), pages)
+                for case in CASES:
+                    elapsed, peak, baseline = runner.submit(run_case, case, source, workdir).result()
+                    print(f"{pages:>6} {case:>5} {elapsed:>8.2f} {pages * len(CASES[case]) / elapsed:>8.1f} "
+                          f"{peak / 1e6:>8.0f} {(peak - baseline) / 1e6:>10.0f}")
+
+
+if __name__ == "__main__":
+    counts = tuple(int(n) for n in sys.argv[1:]) or (100, 500, 1000)
+    bench_word(counts)
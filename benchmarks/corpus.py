@@ -0,0 +1,74 @@
+"""Synthetic PDF inputs for the benchmark scripts
+
+PDFs are written with reportlab's invariant mode, so the same arguments
+always produce the same bytes.
+"""
+import os
+import random
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+
+def make_text_pdf(path, pages, lines_per_page=40, pagesize=letter):
+    """Write a ``pages``-page PDF of plain text lines to ``path``."""
+    c = canvas.Canvas(path, pagesize=pagesize, invariant=1)
+    width, height = pagesize
+    for page in range(pages):
+        c.setFont("Helvetica", 10)
+        for line in range(lines_per_page):
+            c.drawString(50, height - 60 - line * 16,
+                         f"Page {page + 1} line {line + 1}: the quick brown fox jumps over the lazy dog")
+        c.showPage()
+    c.save()
+    return path
+
+
+def make_image_pdf(path, pages, image_px=1200, pagesize=letter, seed=0):
+    """Write a ``pages``-page PDF with one incompressible noise image per page.
+
+    Approximates a scanned document, where page images dominate file size.
+    """
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+    import io
+
+    rng = random.Random(seed)
+    c = canvas.Canvas(path, pagesize=pagesize, invariant=1)
+    width, height = pagesize
+    for page in range(pages):
+        buf = io.BytesIO()
+        Image.frombytes('RGB', (image_px, image_px), rng.randbytes(image_px * image_px * 3)).save(
+            buf, 'JPEG', quality=85)
+        buf.seek(0)
+        c.drawImage(ImageReader(buf), 36, 36, width - 72, height - 72)
+        c.showPage()
+    c.save()
+    return path
+
+
+def make_photo_set(directory, count, size=(4032, 3024), quality=90):
+    """Write ``count`` photo-like JPEGs of ``size`` pixels and return their paths.
+
+    Noise over a gradient keeps the JPEGs close to real phone photos in
+    size and decode cost. One base frame is generated and re-tinted per
+    file so large sets stay quick to build.
+    """
+    from PIL import Image, ImageChops
+
+    width, height = size
+    noise = Image.effect_noise(size, 40).convert('RGB')
+    gradient = Image.linear_gradient('L').resize(size).convert('RGB')
+    base = ImageChops.add(noise, gradient, scale=2)
+
+    paths = []
+    for i in range(count):
+        tint = Image.new('RGB', size, ((i * 37) % 96, (i * 53) % 96, (i * 71) % 96))
+        path = os.path.join(directory, f'photo_{i:04d}.jpg')
+        ImageChops.add(base, tint).save(path, 'JPEG', quality=quality)
+        paths.append(path)
+    return paths
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Benchmark every tool, both as a helper function and as an endpoint
+
+Builds a synthetic corpus (text-heavy, image-heavy and many-small-pages
+PDFs at each size, plus photo sets), then runs each case in a fresh
+process so its peak memory is its own. Records seconds, pages/sec, MB/sec,
+peak RSS and output size, and writes them to JSON:
+
+    python run_all.py --size medium --output before.json
+    python run_all.py --size medium --output after.json --compare before.json
+
+Everything runs in the case's own process (the PDF pool only starts from
+the main process), so memory covers the whole of the work.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from corpus import REPO, make_image_pdf, make_photo_set, make_text_pdf
+
+import app
+import PyPDF2
+
+SIZES = {
+    'small': [10],
+    'medium': [10, 100],
+    'large': [10, 100, 500],
+}
+
+PASSWORD = 'secret'
+
+PIPELINE = json.dumps([
+    {'op': 'number', 'position': 'bottom-right'},
+    {'op': 'watermark', 'watermarkText': 'CONFIDENTIAL', 'opacity': 0.3},
+])
+
+# name: (output extension, needs an encrypted input, call(input paths, output path))
+HELPERS = {
+    'merge_pdf_files': ('.pdf', False, lambda paths, out: app.merge_pdf_files(paths * 2, out)),
+    'convert_pdf_to_pptx': ('.pptx', False, lambda paths, out: app.convert_pdf_to_pptx(paths[0], out)),
+    'convert_pdf_to_docx': ('.docx', False, lambda paths, out: app.convert_pdf_to_docx(paths[0], out)),
+    'write_page_images': ('.zip', False, lambda paths, out: write_page_images(paths[0], out)),
+    'add_page_numbers_to_pdf': ('.pdf', False,
+                                lambda paths, out: app.add_page_numbers_to_pdf(paths[0], out, 'bottom-right', 1)),
+    'add_watermark_to_pdf': ('.pdf', False,
+                             lambda paths, out: app.add_watermark_to_pdf(paths[0], out, 'CONFIDENTIAL', 0.3)),
+    'sign_pdf_file': ('.pdf', False,
+                      lambda paths, out: app.sign_pdf_file(paths[0], out, 'Signed', 'bottom-right')),
+    'crop_pdf_file': ('.pdf', False,
+                      lambda paths, out: app.crop_pdf_file(paths[0], out, 0.05, 0.05, 0.05, 0.05)),
+    'protect_pdf_file': ('.pdf', False, lambda paths, out: app.protect_pdf_file(paths[0], out, PASSWORD)),
+    'unlock_pdf_file': ('.pdf', True, lambda paths, out: app.unlock_pdf_file(paths[0], out, PASSWORD)),
+    'compress_pdf_file': ('.pdf', False, lambda paths, out: app.compress_pdf_file(paths[0], out, 150, 70)),
+    'images_to_pdf': ('.pdf', False, lambda paths, out: app.images_to_pdf(
+        [app.Upload(path, os.path.basename(path), None) for path in paths], out, 'A4', 'portrait', 150)),
+}
+
+# url: (needs an encrypted input, form fields); merge gets each input twice
+ENDPOINTS = {
+    '/merge-pdf': (False, {}),
+    '/pdf-to-ppt': (False, {}),
+    '/pdf-to-word': (False, {}),
+    '/pdf-to-jpg': (False, {'dpi': '150'}),
+    '/add-page-numbers': (False, {'position': 'bottom-right'}),
+    '/add-watermark': (False, {'watermarkText': 'CONFIDENTIAL', 'opacity': '0.3'}),
+    '/sign-pdf': (False, {'signatureText': 'Signed'}),
+    '/crop-pdf': (False, {'top': '5', 'bottom': '5', 'left': '5', 'right': '5'}),
+    '/protect-pdf': (False, {'password': PASSWORD}),
+    '/unlock-pdf': (True, {'password': PASSWORD}),
+    '/compress-pdf': (False, {'preset': 'ebook'}),
+    '/pipeline': (False, {'operations': PIPELINE}),
+    '/jpg-to-pdf': (False, {'targetDpi': '150'}),
+}
+
+IMAGE_CASES = {'images_to_pdf', '/jpg-to-pdf'}
+
+
+def write_page_images(path, output):
+    with open(output, 'wb') as f:
+        for _ in app.write_page_images(path, f, 150, 'jpg', 85):
+            pass
+
+
+def build_corpus(workdir, sizes):
+    """Write the corpus for ``sizes``; return {name: (paths, pages)}."""
+    corpus = {}
+    for size in sizes:
+        text = make_text_pdf(os.path.join(workdir, f'text-{size}.pdf'), size)
+        corpus[f'text-{size}'] = [text]
+
+        image_pages = max(1, size // 10)
+        scan = make_image_pdf(os.path.join(workdir, f'images-{image_pages}.pdf'), image_pages)
+        corpus[f'images-{image_pages}'] = [scan]
+
+        small_pages = size * 10
+        small = make_text_pdf(os.path.join(workdir, f'small-pages-{small_pages}.pdf'), small_pages,
+                              lines_per_page=3, pagesize=(144, 144))
+        corpus[f'small-pages-{small_pages}'] = [small]
+
+        photo_count = max(2, size // 10)
+        photo_dir = os.path.join(workdir, f'photos-{photo_count}')
+        os.makedirs(photo_dir, exist_ok=True)
+        corpus[f'photos-{photo_count}'] = make_photo_set(photo_dir, photo_count)
+
+    return {name: (paths, count_pages(paths)) for name, paths in corpus.items()}
+
+
+def count_pages(paths):
+    if not paths[0].endswith('.pdf'):
+        return len(paths)
+    return sum(len(PyPDF2.PdfReader(path).pages) for path in paths)
+
+
+def list_cases(corpus, only=None):
+    cases = []
+    for name in list(HELPERS) + list(ENDPOINTS):
+        kind = 'endpoint' if name.startswith('/') else 'helper'
+        for corpus_name in corpus:
+            if (name in IMAGE_CASES) != corpus_name.startswith('photos-'):
+                continue
+            if only and not re.search(only, f'{kind} {name} {corpus_name}'):
+                continue
+            cases.append((kind, name, corpus_name))
+    return cases
+
+
+def run_case(kind, name, corpus_name, paths, pages, runs, workdir):
+    """Run one case ``runs`` times in this (fresh) process and report the best."""
+    app.app.config.update(RESULT_CACHE_BYTES=0, EXTRACT_CACHE_PAGES=0,
+                          JOBS_DIR=os.path.join(workdir, 'jobs'), UPLOAD_DIR=workdir)
+    app.warm_up()
+
+    encrypted = HELPERS[name][1] if kind == 'helper' else ENDPOINTS[name][0]
+    if encrypted:
+        locked = os.path.join(workdir, 'locked.pdf')
+        app.protect_pdf_file(paths[0], locked, PASSWORD)
+        paths = [locked]
+    input_bytes = sum(os.path.getsize(path) for path in paths)
+    baseline_rss = app.peak_rss()
+
+    if kind == 'helper':
+        ext, _, call = HELPERS[name]
+        output = os.path.join(workdir, 'output' + ext)
+
+        def once():
+            call(paths, output)
+            return os.path.getsize(output)
+    else:
+        client = app.app.test_client()
+        _, form = ENDPOINTS[name]
+        payloads = []
+        for path in paths * (2 if name == '/merge-pdf' else 1):
+            with open(path, 'rb') as f:
+                payloads.append((f.read(), os.path.basename(path)))
+
+        def once():
+            files = [(io.BytesIO(data), filename) for data, filename in payloads]
+            response = client.post(name, data={'files': files, **form})
+            assert response.status_code == 200, response.data[:200]
+            size = len(response.data)
+            response.close()
+            return size
+
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        output_bytes = once()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak_rss = app.peak_rss()
+    return {
+        'kind': kind,
+        'name': name,
+        'corpus': corpus_name,
+        'pages': pages,
+        'input_bytes': input_bytes,
+        'output_bytes': output_bytes,
+        'seconds': best,
+        'pages_per_sec': pages / best,
+        'mb_per_sec': input_bytes / best / 1e6,
+        'peak_rss_bytes': peak_rss,
+        'peak_rss_growth_bytes': peak_rss - baseline_rss,
+    }
+
+
+def git_revision():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ('-dirty' if dirty else '')
+
+
+def case_key(result):
+    return (result['kind'], result['name'], result['corpus'])
+
+
+def print_results(results, baseline=None):
+    previous = {case_key(result): result for result in (baseline or {}).get('results', [])}
+    print(f"{'case':<46} {'seconds':>8} {'pages/s':>9} {'MB/s':>7} {'peak MB':>8} {'out MB':>7}"
+          + (f" {'change':>7}" if baseline else ''))
+    for result in results:
+        line = (f"{result['name'] + ' ' + result['corpus']:<46} {result['seconds']:>8.3f} "
+                f"{result['pages_per_sec']:>9.1f} {result['mb_per_sec']:>7.2f} "
+                f"{result['peak_rss_bytes'] / 1e6:>8.0f} {result['output_bytes'] / 1e6:>7.2f}")
+        before = previous.get(case_key(result))
+        if before:
+            line += f" {(result['seconds'] / before['seconds'] - 1) * 100:>+6.0f}%"
+        print(line)
+
+
+def run_all(size='small', runs=3, only=None, output=None, baseline=None):
+    revision = git_revision()
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = build_corpus(workdir, SIZES[size])
+        cases = list_cases(corpus, only)
+        print(f"Benchmarking {len(cases)} cases at {revision}, {size} corpus, best of {runs}",
+              file=sys.stderr)
+
+        results = []
+        # One process per case, so each peak RSS belongs to that case alone
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'),
+                                 max_tasks_per_child=1) as runner:
+            for kind, name, corpus_name in cases:
+                paths, pages = corpus[corpus_name]
+                case_dir = tempfile.mkdtemp(dir=workdir)
+                results.append(runner.submit(run_case, kind, name, corpus_name, paths, pages,
+                                             runs, case_dir).result())
+                print(f"  {name} {corpus_name}: {results[-1]['seconds']:.3f}s", file=sys.stderr)
+
+    report = {
+        'revision': revision,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'size': size,
+        'runs': runs,
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    print_results(results, baseline)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', choices=SIZES, default='small', help='corpus size (default: small)')
+    parser.add_argument('--runs', type=int, default=3, help='runs per case; the best is kept')
+    parser.add_argument('--only', help='regex over "<helper|endpoint> <name> <corpus>" to select cases')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier run to compare against')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    run_all(args.size, args.runs, args.only, args.output, baseline)
@@ -0,0 +1,50 @@
+"""Gunicorn settings for PDF Master.
+
+Run with ``gunicorn -c gunicorn.conf.py app:app``. Every setting can be
+overridden from the environment.
+"""
+import multiprocessing
+import os
+
+cpus = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# gthread serves several requests per worker while they wait on uploads,
+# the PDF pool or downloads; sync gives one request per worker
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', cpus))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Each worker runs its own PDF pool; split the CPUs between them rather
+# than giving every worker a pool the size of the machine
+os.environ.setdefault('PDF_WORKERS', str(max(1, cpus // workers)))
+
+# Recycle workers now and then so slow leaks in the PDF libraries cannot build up
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 500))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 50))
+
+# A synchronous request may wait out a whole PDF task before it answers
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', int(os.environ.get('PDF_TASK_TIMEOUT', 300)) + 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Import app.py once in the master, and its backend libraries with it (see
+# on_starting), so workers start with them already loaded. Pools, queues and
+# background threads are all created on first use, after the fork; only the
+# admission counters are created before it, so every worker shares them.
+preload_app = True
+
+# Heartbeat files on tmpfs, so a slow disk cannot get workers killed
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+
+
+def on_starting(server):
+    # app.py imports its PDF, image and Office libraries on first use; with
+    # preload_app, load them here once instead of in every worker
+    if server.cfg.preload_app:
+        from app import warm_up
+        warm_up()
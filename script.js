@@ -1,7 +1,16 @@
+// A single PDF up to this size is processed in one request; anything
+// bigger, or not inspected yet, goes through a background job
+const SYNC_PAGE_LIMIT = 50;
+const SYNC_BYTE_LIMIT = 20 * 1024 * 1024;
+// Give up on a background job that has not finished in this long
+const JOB_POLL_LIMIT_MS = 30 * 60 * 1000;
+
 class PDFMaster {
     constructor() {
         this.currentTool = null;
         this.selectedFiles = [];
+        // What /inspect reported about each selected PDF
+        this.inspections = new Map();
         this.init();
     }
 
@@ -96,6 +105,7 @@ class PDFMaster {
 
         // Clear previous files and options
         this.selectedFiles = [];
+        this.inspections.clear();
         this.updateFileList();
         this.updateProcessButton();
         toolOptions.innerHTML = toolConfig.options;
@@ -144,6 +154,29 @@ class PDFMaster {
                             <option value="landscape">Landscape</option>
                         </select>
                     </div>
+                    <div class="option-group">
+                        <label>Image Resolution:</label>
+                        <select id="targetDpi">
+                            <option value="0">Original</option>
+                            <option value="300">High (300 DPI)</option>
+                            <option value="150" selected>Standard (150 DPI)</option>
+                            <option value="96">Small (96 DPI)</option>
+                        </select>
+                    </div>
+                `
+            },
+            'compress': {
+                title: 'Compress PDF',
+                accept: '.pdf',
+                options: `
+                    <div class="option-group">
+                        <label>Compression Level:</label>
+                        <select id="compressionPreset">
+                            <option value="screen">Extreme (screen, 72 DPI)</option>
+                            <option value="ebook" selected>Recommended (ebook, 150 DPI)</option>
+                            <option value="print">Less (print, 300 DPI)</option>
+                        </select>
+                    </div>
                 `
             },
             'pdf-to-ppt': {
@@ -151,6 +184,40 @@ class PDFMaster {
                 accept: '.pdf',
                 options: ''
             },
+            'pdf-to-word': {
+                title: 'Convert PDF to Word',
+                accept: '.pdf',
+                options: ''
+            },
+            'pdf-to-jpg': {
+                title: 'Convert PDF to Images',
+                accept: '.pdf',
+                options: `
+                    <div class="option-group">
+                        <label>Format:</label>
+                        <select id="imageFormat">
+                            <option value="jpg" selected>JPG</option>
+                            <option value="png">PNG</option>
+                        </select>
+                    </div>
+                    <div class="option-group">
+                        <label>Resolution:</label>
+                        <select id="imageDpi">
+                            <option value="72">Screen (72 DPI)</option>
+                            <option value="150" selected>Standard (150 DPI)</option>
+                            <option value="300">High (300 DPI)</option>
+                        </select>
+                    </div>
+                    <div class="option-group">
+                        <label>JPG Quality:</label>
+                        <input type="range" id="imageQuality" min="10" max="100" value="85">
+                    </div>
+                    <div class="option-group">
+                        <label>Pages:</label>
+                        <input type="text" id="imagePages" placeholder="All pages, or e.g. 1-3, 8, odd, even, every 2">
+                    </div>
+                `
+            },
             'add-page-numbers': {
                 title: 'Add Page Numbers',
                 accept: '.pdf',
@@ -168,6 +235,10 @@ class PDFMaster {
                         <label>Starting Number:</label>
                         <input type="number" id="startingNumber" value="1" min="1">
                     </div>
+                    <div class="option-group">
+                        <label>Pages:</label>
+                        <input type="text" id="numberPages" placeholder="All pages, or e.g. 1-3, 8, odd, even, every 2">
+                    </div>
                 `
             },
             'add-watermark': {
@@ -183,6 +254,10 @@ class PDFMaster {
                         <input type="range" id="watermarkOpacity" min="10" max="100" value="50">
                         <span id="opacityValue">50%</span>
                     </div>
+                    <div class="option-group">
+                        <label>Pages:</label>
+                        <input type="text" id="watermarkPages" placeholder="All pages, or e.g. 1-3, 8, odd, even, every 2">
+                    </div>
                 `
             },
             'crop-pdf': {
@@ -196,6 +271,10 @@ class PDFMaster {
                         <input type="number" id="cropLeft" placeholder="Left" value="0">
                         <input type="number" id="cropRight" placeholder="Right" value="0">
                     </div>
+                    <div class="option-group">
+                        <label>Pages:</label>
+                        <input type="text" id="cropPages" placeholder="All pages, or e.g. 1-3, 8, odd, even, every 2">
+                    </div>
                 `
             },
             'unlock-pdf': {
@@ -220,6 +299,15 @@ class PDFMaster {
                         <label>Confirm Password:</label>
                         <input type="password" id="confirmPassword" placeholder="Confirm password">
                     </div>
+                    <div class="option-group">
+                        <label>Encryption:</label>
+                        <select id="encryption">
+                            <option value="" selected>Strongest available (recommended)</option>
+                            <option value="aes-256">AES 256-bit</option>
+                            <option value="aes-128">AES 128-bit</option>
+                            <option value="rc4-128">RC4 128-bit (older readers)</option>
+                        </select>
+                    </div>
                 `
             },
             'sign-pdf': {
@@ -250,12 +338,60 @@ class PDFMaster {
         Array.from(files).forEach(file => {
             if (!this.selectedFiles.find(f => f.name === file.name && f.size === file.size)) {
                 this.selectedFiles.push(file);
+                if (file.name.toLowerCase().endsWith('.pdf')) {
+                    this.inspectFile(file);
+                }
             }
         });
         this.updateFileList();
         this.updateProcessButton();
     }
 
+    async inspectFile(file) {
+        const formData = new FormData();
+        formData.append('files', file);
+        try {
+            const response = await fetch('/inspect', { method: 'POST', body: formData });
+            if (!response.ok) {
+                this.inspections.set(file, { error: await this.readError(response) });
+            } else {
+                this.inspections.set(file, (await response.json()).files[0]);
+            }
+        } catch {
+            // Inspection only informs the UI; the tool request still decides
+            return;
+        }
+        if (this.selectedFiles.includes(file)) {
+            this.updateFileList();
+        }
+    }
+
+    describeInspection(file) {
+        const info = this.inspections.get(file);
+        if (!info) {
+            return '';
+        }
+        if (info.error) {
+            return ` &middot; <span class="file-warning">${info.error}</span>`;
+        }
+        if (info.needs_password && this.currentTool !== 'unlock-pdf') {
+            return ' &middot; <span class="file-warning">Password protected, unlock it first</span>';
+        }
+        if (info.pages === null) {
+            return '';
+        }
+        return ` &middot; ${info.pages} page${info.pages === 1 ? '' : 's'}`;
+    }
+
+    useJob() {
+        if (this.selectedFiles.length !== 1) {
+            return true;
+        }
+        const file = this.selectedFiles[0];
+        const info = this.inspections.get(file);
+        return !info || !info.pages || info.pages > SYNC_PAGE_LIMIT || file.size > SYNC_BYTE_LIMIT;
+    }
+
     updateFileList() {
         const fileList = document.getElementById('fileList');
         fileList.innerHTML = '';
@@ -268,7 +404,7 @@ class PDFMaster {
                     <i class="fas fa-file-pdf"></i>
                     <div class="file-details">
                         <h4>${file.name}</h4>
-                        <p>${this.formatFileSize(file.size)}</p>
+                        <p>${this.formatFileSize(file.size)}${this.describeInspection(file)}</p>
                     </div>
                 </div>
                 <button class="remove-file" onclick="pdfMaster.removeFile(${index})">
@@ -336,39 +472,58 @@ class PDFMaster {
                 throw new Error('No endpoint configured for this tool');
             }
             
-            this.simulateProgress();
-            
-            const response = await fetch(endpoint, {
-                method: 'POST',
-                body: formData
-            });
+            let job;
+            let result;
+            let useJob = this.useJob();
+            if (!useJob) {
+                progressText.textContent = 'Processing...';
+                result = await fetch(endpoint, {
+                    method: 'POST',
+                    body: formData
+                });
+                job = {
+                    input_size: Number(result.headers.get('X-Input-Size')),
+                    output_size: Number(result.headers.get('X-Output-Size'))
+                };
+                // The server is too busy to start now; a job waits its turn
+                useJob = result.status === 503;
+            }
+            if (useJob) {
+                const response = await fetch(`/jobs${endpoint}`, {
+                    method: 'POST',
+                    body: formData
+                });
+
+                if (!response.ok) {
+                    throw new Error(await this.readError(response));
+                }
+
+                job = await this.pollJob(await response.json());
+                result = await fetch(job.result_url);
+            }
 
-            if (response.ok) {
-                const blob = await response.blob();
+            if (!result.ok) {
+                throw new Error(await this.readError(result));
+            }
+
+            const blob = await result.blob();
+
+            if (blob.size > 0) {
+                const url = window.URL.createObjectURL(blob);
+                const a = document.createElement('a');
+                a.href = url;
+                // Several files for a single-file tool come back as a ZIP
+                a.download = blob.type === 'application/zip'
+                    ? this.getDownloadFilename().replace(/\.[^.]+$/, '.zip')
+                    : this.getDownloadFilename();
+                document.body.appendChild(a);
+                a.click();
+                document.body.removeChild(a);
+                window.URL.revokeObjectURL(url);
                 
-                if (blob.size > 0) {
-                    const url = window.URL.createObjectURL(blob);
-                    const a = document.createElement('a');
-                    a.href = url;
-                    a.download = this.getDownloadFilename();
-                    document.body.appendChild(a);
-                    a.click();
-                    document.body.removeChild(a);
-                    window.URL.revokeObjectURL(url);
-                    
-                    this.completeProcessing(true);
-                } else {
-                    throw new Error('Empty response received');
-                }
+                this.completeProcessing(true, job);
             } else {
-                let errorMessage = 'Processing failed';
-                try {
-                    const error = await response.json();
-                    errorMessage = error.error || errorMessage;
-                } catch {
-                    errorMessage = `Server error: ${response.status} ${response.statusText}`;
-                }
-                throw new Error(errorMessage);
+                throw new Error('Empty response received');
             }
         } catch (error) {
             this.showError(error.message);
@@ -380,20 +535,34 @@ class PDFMaster {
             case 'jpg-to-pdf':
                 const pageSize = document.getElementById('pageSize')?.value || 'A4';
                 const orientation = document.getElementById('orientation')?.value || 'portrait';
+                const targetDpi = document.getElementById('targetDpi')?.value || '0';
                 formData.append('pageSize', pageSize);
                 formData.append('orientation', orientation);
+                formData.append('targetDpi', targetDpi);
+                break;
+            case 'compress':
+                const preset = document.getElementById('compressionPreset')?.value || 'ebook';
+                formData.append('preset', preset);
+                break;
+            case 'pdf-to-jpg':
+                formData.append('format', document.getElementById('imageFormat')?.value || 'jpg');
+                formData.append('dpi', document.getElementById('imageDpi')?.value || '150');
+                formData.append('quality', document.getElementById('imageQuality')?.value || '85');
+                formData.append('pages', document.getElementById('imagePages')?.value || '');
                 break;
             case 'add-page-numbers':
                 const position = document.getElementById('numberPosition')?.value || 'bottom-right';
                 const startPage = document.getElementById('startingNumber')?.value || '1';
                 formData.append('position', position);
                 formData.append('startPage', startPage);
+                formData.append('pages', document.getElementById('numberPages')?.value || '');
                 break;
             case 'add-watermark':
                 const watermarkText = document.getElementById('watermarkText')?.value || 'WATERMARK';
                 const opacity = document.getElementById('watermarkOpacity')?.value || '50';
                 formData.append('watermarkText', watermarkText);
                 formData.append('opacity', parseFloat(opacity) / 100);
+                formData.append('pages', document.getElementById('watermarkPages')?.value || '');
                 break;
             case 'crop-pdf':
                 const top = document.getElementById('cropTop')?.value || '0';
@@ -404,6 +573,7 @@ class PDFMaster {
                 formData.append('bottom', bottom);
                 formData.append('left', left);
                 formData.append('right', right);
+                formData.append('pages', document.getElementById('cropPages')?.value || '');
                 break;
             case 'unlock-pdf':
                 const password = document.getElementById('pdfPassword')?.value || '';
@@ -412,6 +582,7 @@ class PDFMaster {
             case 'protect-pdf':
                 const newPassword = document.getElementById('newPassword')?.value || '';
                 formData.append('password', newPassword);
+                formData.append('encryption', document.getElementById('encryption')?.value || '');
                 break;
             case 'sign-pdf':
                 const signatureText = document.getElementById('signatureText')?.value || 'SIGNED';
@@ -426,7 +597,10 @@ class PDFMaster {
         const endpoints = {
             'merge': '/merge-pdf',
             'jpg-to-pdf': '/jpg-to-pdf',
+            'compress': '/compress-pdf',
             'pdf-to-ppt': '/pdf-to-ppt',
+            'pdf-to-jpg': '/pdf-to-jpg',
+            'pdf-to-word': '/pdf-to-word',
             'add-page-numbers': '/add-page-numbers',
             'add-watermark': '/add-watermark',
             'crop-pdf': '/crop-pdf',
@@ -443,7 +617,10 @@ class PDFMaster {
         const filenames = {
             'merge': `merged_pdf_${timestamp}.pdf`,
             'jpg-to-pdf': `images_to_pdf_${timestamp}.pdf`,
+            'compress': `compressed_pdf_${timestamp}.pdf`,
             'pdf-to-ppt': `pdf_to_ppt_${timestamp}.pptx`,
+            'pdf-to-jpg': `pdf_to_jpg_${timestamp}.zip`,
+            'pdf-to-word': `pdf_to_word_${timestamp}.docx`,
             'add-page-numbers': `numbered_pdf_${timestamp}.pdf`,
             'add-watermark': `watermarked_pdf_${timestamp}.pdf`,
             'crop-pdf': `cropped_pdf_${timestamp}.pdf`,
@@ -454,23 +631,45 @@ class PDFMaster {
         return filenames[this.currentTool] || `processed_${timestamp}.pdf`;
     }
 
-    simulateProgress() {
+    async pollJob(job) {
         const progressFill = document.getElementById('progressFill');
         const progressText = document.getElementById('progressText');
-        let progress = 0;
-        
-        const interval = setInterval(() => {
-            progress += Math.random() * 10;
-            if (progress >= 90) {
-                progress = 90;
-                clearInterval(interval);
+        const deadline = Date.now() + JOB_POLL_LIMIT_MS;
+
+        while (job.status === 'queued' || job.status === 'running') {
+            if (Date.now() > deadline) {
+                throw new Error('Processing is taking too long, please try again later');
             }
-            progressFill.style.width = progress + '%';
-            progressText.textContent = `Processing... ${Math.round(progress)}%`;
-        }, 100);
+            progressFill.style.width = job.progress + '%';
+            progressText.textContent = job.status === 'queued'
+                ? 'Waiting in queue...'
+                : `Processing... ${job.progress}%`;
+
+            await new Promise(resolve => setTimeout(resolve, 500));
+
+            const response = await fetch(`/jobs/${job.id}`);
+            if (!response.ok) {
+                throw new Error(await this.readError(response));
+            }
+            job = await response.json();
+        }
+
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Processing failed');
+        }
+        return job;
     }
 
-    completeProcessing(success = false) {
+    async readError(response) {
+        try {
+            const error = await response.json();
+            return error.error || 'Processing failed';
+        } catch {
+            return `Server error: ${response.status} ${response.statusText}`;
+        }
+    }
+
+    completeProcessing(success = false, job = null) {
         const progressText = document.getElementById('progressText');
         const processBtn = document.getElementById('processBtn');
         const progressFill = document.getElementById('progressFill');
@@ -478,6 +677,10 @@ class PDFMaster {
         if (success) {
             progressFill.style.width = '100%';
             progressText.innerHTML = '<i class="fas fa-check-circle" style="color: #48bb78;"></i> Processing Complete! File downloaded.';
+            if (this.currentTool === 'compress' && job && job.input_size) {
+                const saved = Math.max(0, 1 - job.output_size / job.input_size);
+                progressText.innerHTML += ` Reduced by ${Math.round(saved * 100)}%.`;
+            }
             processBtn.innerHTML = '<i class="fas fa-redo"></i> Process More Files';
         } else {
             progressText.innerHTML = '<i class="fas fa-times-circle" style="color: #e53e3e;"></i> Processing Failed!';
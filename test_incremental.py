@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Test script to check PDFs written as incremental updates"""
+import io
+import os
+import struct
+import tempfile
+
+import fitz
+import PyPDF2
+
+import app
+
+def make_table_pdf(path):
+    """A one-page PDF indexed by a classic xref table."""
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return path
+
+def make_stream_pdf(path):
+    """A one-page PDF indexed by a cross-reference stream."""
+    content = b'BT /F1 12 Tf 72 720 Td (Original) Tj ET'
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R'
+        b' /Resources << /Font << /F1 5 0 R >> >> >>',
+        b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    out = io.BytesIO()
+    out.write(b'%PDF-1.5\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+    xref_number = len(objects) + 1
+    offsets.append(out.tell())
+    rows = struct.pack('>BIH', 0, 0, 65535)
+    rows += b''.join(struct.pack('>BIH', 1, offset, 0) for offset in offsets)
+    out.write(b'%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 2] /Root 1 0 R /Length %d >>\nstream\n'
+              % (xref_number, xref_number + 1, len(rows)))
+    out.write(rows + b'\nendstream\nendobj\n')
+    out.write(b'startxref\n%d\n%%%%EOF\n' % offsets[-1])
+    with open(path, 'wb') as f:
+        f.write(out.getvalue())
+    return path
+
+def make_shifted_pdf(path):
+    """A PDF whose startxref no longer points at its xref table."""
+    make_table_pdf(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    header_end = data.index(b'\n') + 1
+    with open(path, 'wb') as f:
+        f.write(data[:header_end] + b'%' + b'shifted ' * 8 + b'\n' + data[header_end:])
+    return path
+
+def stamp_twice(source, workdir):
+    numbered = os.path.join(workdir, 'numbered.pdf')
+    signed = os.path.join(workdir, 'signed.pdf')
+    app.add_page_numbers_to_pdf(source, numbered, 'bottom-right', 1)
+    app.sign_pdf_file(numbered, signed, 'Tester', 'bottom-left')
+    return numbered, signed
+
+def check_revisions(source, numbered, signed):
+    with open(source, 'rb') as f:
+        original = f.read()
+    with open(numbered, 'rb') as f:
+        first = f.read()
+    with open(signed, 'rb') as f:
+        second = f.read()
+    # Each update keeps the bytes of the revisions before it
+    assert first.startswith(original) and len(first) > len(original)
+    assert second.startswith(first) and len(second) > len(first)
+
+    # The page number from the first update and the signature from the second
+    text = PyPDF2.PdfReader(numbered, strict=True).pages[0].extract_text()
+    assert text.split()[-1] == '1', text
+    text = PyPDF2.PdfReader(signed, strict=True).pages[0].extract_text()
+    assert 'Digitally Signed: Tester' in text, text
+
+    with fitz.open(signed) as doc:
+        assert not doc.is_repaired
+        assert doc.version_count == 3, doc.version_count
+        lines = doc[0].get_text().split('\n')
+        assert '1' in lines, lines
+        assert 'Digitally Signed: Tester' in lines, lines
+
+def test_incremental_updates():
+    print("Testing incremental updates...")
+
+    for name, make in (('xref table', make_table_pdf), ('xref stream', make_stream_pdf)):
+        with tempfile.TemporaryDirectory() as workdir:
+            source = make(os.path.join(workdir, 'input.pdf'))
+            check_revisions(source, *stamp_twice(source, workdir))
+        print(f"✅ Stamped twice over an {name}")
+
+    # PyPDF2 reads a damaged xref by rebuilding it, but an update cannot
+    # point back at it, so the whole file is rewritten instead
+    with tempfile.TemporaryDirectory() as workdir:
+        source = make_shifted_pdf(os.path.join(workdir, 'input.pdf'))
+        output = os.path.join(workdir, 'numbered.pdf')
+        app.add_page_numbers_to_pdf(source, output, 'bottom-right', 1)
+        with open(source, 'rb') as f, open(output, 'rb') as g:
+            assert not g.read().startswith(f.read())
+        assert len(PyPDF2.PdfReader(output, strict=True).pages) == 1
+        with fitz.open(output) as doc:
+            assert not doc.is_repaired
+    print("✅ A broken xref is rewritten rather than updated")
+
+    print("✅ Incremental updates open cleanly in PyPDF2 and PyMuPDF!")
+
+if __name__ == "__main__":
+    test_incremental_updates()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Test script to check /inspect answers bad uploads with a JSON error"""
+import io
+
+import PyPDF2
+
+import app
+
+def post(client, data, filename):
+    return client.post('/inspect', data={'files': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+def test_inspect_rejects_junk():
+    print("Testing /inspect...")
+    client = app.app.test_client()
+
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+    response = post(client, pdf.getvalue(), 'ok.pdf')
+    assert response.status_code == 200, response.data
+    assert response.get_json()['files'][0]['pages'] == 1
+    print("✅ A PDF is inspected")
+
+    # Past the first 1 KB, the upload is sniffed while the body is parsed
+    for size in (100, 2048):
+        response = post(client, b'x' * size, 'x.pdf')
+        assert response.status_code == 400, (size, response.status_code)
+        assert 'error' in response.get_json()
+    print("✅ Junk named .pdf gets a JSON 400")
+
+    print("✅ /inspect handles bad uploads!")
+    return True
+
+if __name__ == "__main__":
+    test_inspect_rejects_junk()
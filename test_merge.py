@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Test script to check Merge PDF keeps each input's bookmarks"""
+import os
+import tempfile
+
+import fitz
+
+import app
+
+def make_pdf(path, label, pages):
+    doc = fitz.open()
+    for i in range(pages):
+        doc.new_page().insert_text((72, 72), f'{label} page {i + 1}')
+    doc.set_toc([[1, f'Outline {label}', 1], [2, f'Section {label}', pages]])
+    doc.save(path)
+    doc.close()
+    return path
+
+def test_merge_keeps_bookmarks():
+    print("Testing Merge PDF bookmarks...")
+    expected = [[1, 'Outline a', 1], [2, 'Section a', 2],
+                [1, 'Outline b', 3], [2, 'Section b', 5]]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        inputs = [make_pdf(os.path.join(workdir, 'a.pdf'), 'a', 2),
+                  make_pdf(os.path.join(workdir, 'b.pdf'), 'b', 3)]
+        # Written in one save, and flushed to disk after every input
+        for flush_bytes in (None, 1):
+            output = os.path.join(workdir, 'merged.pdf')
+            app.merge_pdf_files(inputs, output, flush_bytes)
+            with fitz.open(output) as doc:
+                assert doc.page_count == 5
+                assert doc.get_toc() == expected, doc.get_toc()
+        print("✅ Bookmarks survive the merge, moved to their pages")
+
+    print("✅ Merge PDF keeps bookmarks!")
+    return True
+
+if __name__ == "__main__":
+    test_merge_keeps_bookmarks()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Test script to check Protect PDF when only PyPDF2 can encrypt"""
+import io
+import json
+
+import PyPDF2
+
+import app
+
+def make_pdf():
+    writer = PyPDF2.PdfWriter()
+    writer.add_blank_page(width=612, height=792)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+def post(client, endpoint, data):
+    data = dict(data, files=(io.BytesIO(make_pdf()), 'input.pdf'))
+    return client.post(endpoint, data=data, content_type='multipart/form-data')
+
+def test_protect_pypdf2_only():
+    print("Testing Protect PDF with the PyPDF2 backend...")
+    app.app.config.update(PDF_CRYPTO='pypdf2', PDF_WORKERS=0, RESULT_CACHE_BYTES=0)
+    client = app.app.test_client()
+
+    # No encryption asked for: the strongest method PyPDF2 writes
+    response = post(client, '/protect-pdf', {'password': 'secret'})
+    assert response.status_code == 200, response.data
+    reader = PyPDF2.PdfReader(io.BytesIO(response.data))
+    assert reader.is_encrypted and reader.decrypt('secret')
+    assert len(reader.pages) == 1
+    print("✅ Default encryption falls back to RC4")
+
+    # AES asked for by name cannot be written, and says so
+    response = post(client, '/protect-pdf', {'password': 'secret', 'encryption': 'aes-256'})
+    assert response.status_code == 400, response.status_code
+    assert 'aes-256' in response.get_json()['error']
+    print("✅ AES without PyMuPDF is a 400")
+
+    # The pipeline's encrypt step does the same
+    operations = [{'op': 'number'}, {'op': 'encrypt', 'password': 'secret'}]
+    response = post(client, '/pipeline', {'operations': json.dumps(operations)})
+    assert response.status_code == 200, response.data
+    assert PyPDF2.PdfReader(io.BytesIO(response.data)).decrypt('secret')
+    operations[-1]['encryption'] = 'aes-128'
+    response = post(client, '/pipeline', {'operations': json.dumps(operations)})
+    assert response.status_code == 400, response.status_code
+    print("✅ Pipeline encrypt falls back to RC4 too")
+
+    print("✅ Protect PDF works with PyPDF2 alone!")
+    return True
+
+if __name__ == "__main__":
+    test_protect_pypdf2_only()